@@ -0,0 +1,145 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+
+class AudioCache:
+    """Size-capped LRU cache of local opus files for frequently played tracks"""
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, min_plays=3, play_window=7 * 86400, max_downloads=1, timeout=600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays  # Admission - only tracks played this often get cached
+        self.play_window = play_window  # Plays older than this stop counting
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._downloads = {}  # video_id -> running download task
+        self._download_semaphore = asyncio.Semaphore(max_downloads)
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        # EVERY PLAY COMMITS - WAL WITHOUT A FULL FSYNC PER COMMIT KEEPS THAT CHEAP
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                video_id TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS plays (
+                video_id TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                first_played REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._reconcile()
+
+    def _path(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.opus")
+
+    def _reconcile(self):
+        # DROP INDEX ROWS WHOSE FILES ARE GONE AND HALF-WRITTEN DOWNLOADS FROM A PREVIOUS RUN
+        for name in os.listdir(self.directory):
+            if name.endswith('.part'):
+                os.remove(os.path.join(self.directory, name))
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id FROM files").fetchall()
+            missing = [(video_id,) for (video_id,) in rows if not os.path.exists(self._path(video_id))]
+            self._conn.executemany("DELETE FROM files WHERE video_id = ?", missing)
+            self._conn.commit()
+
+    def lookup(self, video_id):
+        """Local file path for a cached track, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM files WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None or not os.path.exists(self._path(video_id)):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE files SET last_used = ? WHERE video_id = ?", (time.time(), video_id))
+            self._conn.commit()
+        self.hits += 1
+        return self._path(video_id)
+
+    def record_play(self, video_id):
+        """Count a play and return True once the track has earned a spot in the cache"""
+        now = time.time()
+        with self._lock:
+            # PLAY COUNTS RESET ONCE THEIR WINDOW PASSES - KEEPS THE TABLE BOUNDED TOO
+            self._conn.execute("DELETE FROM plays WHERE first_played < ?", (now - self.play_window,))
+            self._conn.execute(
+                "INSERT INTO plays VALUES (?, 1, ?) ON CONFLICT(video_id) DO UPDATE SET count = count + 1",
+                (video_id, now)
+            )
+            count = self._conn.execute("SELECT count FROM plays WHERE video_id = ?", (video_id,)).fetchone()[0]
+            cached = self._conn.execute("SELECT 1 FROM files WHERE video_id = ?", (video_id,)).fetchone()
+            self._conn.commit()
+        return count >= self.min_plays and not cached
+
+    def schedule_download(self, video_id, url, codec=None, before_options=None):
+        if video_id in self._downloads:
+            return
+        self._downloads[video_id] = asyncio.create_task(self._download(video_id, url, codec, before_options))
+
+    async def _download(self, video_id, url, codec, before_options):
+        path = self._path(video_id)
+        part = f"{path}.part"
+        try:
+            async with self._download_semaphore:
+                args = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+                if before_options:
+                    args += before_options.split()
+                # OPUS STREAMS ARE REMUXED AS-IS, ANYTHING ELSE IS TRANSCODED ONCE
+                audio_codec = ['-c:a', 'copy'] if codec == 'opus' else ['-c:a', 'libopus', '-b:a', '128k']
+                args += ['-i', url, '-vn', *audio_codec, '-f', 'opus', part]
+
+                process = await asyncio.create_subprocess_exec(
+                    *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    process.kill()
+                    await process.wait()
+                    raise
+                if process.returncode != 0:
+                    print(f"Error caching audio for {video_id}: {stderr.decode('utf-8', errors='replace').strip()}")
+                    return
+
+            os.replace(part, path)
+            size = os.path.getsize(path)
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (video_id, size, time.time()))
+                self._evict()
+                self._conn.commit()
+            print(f"Cached audio for {video_id} ({size / 1024 ** 2:.1f} MB)")
+
+        except Exception as e:
+            print(f"Error caching audio for {video_id}: {e}")
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+            self._downloads.pop(video_id, None)
+
+    def _evict(self):
+        # LEAST RECENTLY PLAYED FILES GO FIRST UNTIL WE'RE BACK UNDER THE BYTE BUDGET
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for video_id, size in self._conn.execute("SELECT video_id, size FROM files ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if os.path.exists(self._path(video_id)):
+                os.remove(self._path(video_id))
+            self._conn.execute("DELETE FROM files WHERE video_id = ?", (video_id,))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "files": count, "bytes": total, "downloading": len(self._downloads)}
@@ -0,0 +1,106 @@
+# MICRO-BENCHMARK: OLD FUZZYWUZZY LOOP VS RAPIDFUZZ BATCH MATCHING IN MBClient
+# Run from the repo root: python benchmarks/bench_matching.py
+import os
+import random
+import re
+import sys
+import time
+
+from fuzzywuzzy import fuzz as fw_fuzz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from musicbrainz import MBClient
+
+SEED = 1234
+QUERIES = 2000
+CANDIDATES_PER_QUERY = 25
+THRESHOLD = 75
+
+WORDS = [
+    "love", "night", "city", "fire", "blue", "heart", "dream", "money", "summer", "ghost",
+    "river", "gold", "runaway", "midnight", "shadow", "paradise", "electric", "stranger",
+    "highway", "thunder", "honey", "wild", "young", "forever", "sugar", "lights", "rain",
+]
+
+
+# ORIGINAL IMPLEMENTATION - KEPT HERE AS THE BASELINE
+def old_clean_text(text):
+    text = text.lower()
+    text = re.sub(r'[.,!?\'"()[\]{}]', '', text)
+    text = text.replace('&', 'and')
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip()
+    return text
+
+
+def old_best_match(query_string, candidates, score_threshold=THRESHOLD):
+    matched_result = None
+    score = score_threshold
+    for candidate in candidates:
+        mb_match_string = f"{candidate['artist']} - {candidate['track']}"
+        track_score = fw_fuzz.token_sort_ratio(old_clean_text(query_string), old_clean_text(mb_match_string))
+        if track_score > score:
+            score = track_score
+            matched_result = candidate
+    return matched_result
+
+
+# FIXED CORPUS - SAME SEED, SAME QUERIES EVERY RUN
+def make_name(rng, words):
+    return " ".join(rng.choice(WORDS).title() for _ in range(words))
+
+
+def mangle(rng, text):
+    # TYPICAL /PLAY NOISE - CASE, PUNCTUATION, TYPOS, AMPERSANDS, EXTRA WORDS
+    text = text.lower() if rng.random() < 0.5 else text
+    if rng.random() < 0.3 and len(text) > 4:
+        i = rng.randrange(len(text) - 1)
+        text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if rng.random() < 0.2:
+        text = text.replace(" and ", " & ")
+    if rng.random() < 0.2:
+        text += rng.choice([" (official audio)", " lyrics", "!", " remastered"])
+    return text
+
+
+def build_corpus():
+    rng = random.Random(SEED)
+    corpus = []
+    for _ in range(QUERIES):
+        artist = make_name(rng, rng.randint(1, 2))
+        candidates = [
+            {"artist": artist, "track": make_name(rng, rng.randint(1, 4)), "mbid": f"mbid-{rng.getrandbits(32):08x}"}
+            for _ in range(CANDIDATES_PER_QUERY)
+        ]
+        target = rng.choice(candidates)
+        order = [f"{artist} {target['track']}", f"{target['track']} {artist}"]
+        query = mangle(rng, rng.choice(order))
+        corpus.append((query, candidates))
+    return corpus
+
+
+def run(label, match, corpus):
+    start = time.perf_counter()
+    results = [match(query, candidates) for query, candidates in corpus]
+    elapsed = time.perf_counter() - start
+    comparisons = len(corpus) * CANDIDATES_PER_QUERY
+    print(f"{label:<10} {elapsed * 1000:9.1f} ms  {comparisons / elapsed:12,.0f} candidates/s  "
+          f"{sum(r is not None for r in results):5d} matched")
+    return results, elapsed
+
+
+if __name__ == "__main__":
+    corpus = build_corpus()
+    client = MBClient()
+    new_match = lambda query, candidates: client._best_match(query, candidates, THRESHOLD)
+
+    print(f"{QUERIES} queries x {CANDIDATES_PER_QUERY} candidates (seed {SEED})")
+    old_results, old_time = run("fuzzywuzzy", old_best_match, corpus)
+    new_results, new_time = run("rapidfuzz", new_match, corpus)
+
+    agree = sum(
+        (a and a["mbid"]) == (b and b["mbid"])
+        for a, b in zip(old_results, new_results)
+    )
+    print(f"speedup    {old_time / new_time:9.1f}x")
+    print(f"agreement  {agree}/{len(corpus)} ({agree / len(corpus):.2%})")
@@ -0,0 +1,100 @@
+# BENCHMARK: CPU PER CONCURRENT STREAM - PCM + LOUDNORM + PYTHON OPUS ENCODE VS OPUS PASSTHROUGH
+# Needs ffmpeg and libopus (both are in the Docker image). Run from the repo root:
+#   python benchmarks/bench_playback.py [streams] [seconds] [source]
+# With no source, a 48kHz opus/webm test file is generated with ffmpeg.
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import discord
+import discord.opus
+
+FFMPEG_BEFORE_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+LOUDNORM_FILTER = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+FRAME_SECONDS = 0.02  # Discord sends one 20ms opus packet per frame
+
+
+def make_test_file(directory, seconds):
+    path = os.path.join(directory, 'test.webm')
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={seconds + 5}',
+        '-ac', '2', '-c:a', 'libopus', '-b:a', '128k', path,
+    ], check=True)
+    return path
+
+
+def before_options(url):
+    # RECONNECT FLAGS ONLY EXIST FOR HTTP INPUTS - FFMPEG REFUSES TO OPEN A LOCAL FILE WITH THEM
+    return FFMPEG_BEFORE_OPTIONS if url.startswith(('http://', 'https://')) else None
+
+
+def pcm_source(url):
+    # WHAT play_song DOES TODAY
+    return discord.FFmpegPCMAudio(url, before_options=before_options(url), options=f'-vn -af "{LOUDNORM_FILTER}"')
+
+
+def opus_source(url):
+    return discord.FFmpegOpusAudio(url, codec='copy', before_options=before_options(url), options='-vn')
+
+
+def play(source, encoder, seconds, frames_out):
+    # PACED LIKE discord.py'S AudioPlayer - ONE FRAME EVERY 20MS, ENCODING PCM WHERE IT WOULD
+    frames = 0
+    start = time.perf_counter()
+    while frames * FRAME_SECONDS < seconds:
+        data = source.read()
+        if not data:
+            break
+        if encoder:
+            encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        frames += 1
+        delay = start + frames * FRAME_SECONDS - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    source.cleanup()
+    frames_out.append(frames)
+
+
+def run(label, make_source, url, streams, seconds):
+    cpu_start = time.process_time()
+    children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wall_start = time.perf_counter()
+
+    frames = []
+    threads = []
+    for _ in range(streams):
+        source = make_source(url)
+        encoder = discord.opus.Encoder() if not source.is_opus() else None
+        thread = threading.Thread(target=play, args=(source, encoder, seconds, frames))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - wall_start
+    bot_cpu = time.process_time() - cpu_start
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    ffmpeg_cpu = (children.ru_utime - children_start.ru_utime) + (children.ru_stime - children_start.ru_stime)
+
+    per_stream = (bot_cpu + ffmpeg_cpu) / wall / streams * 100
+    print(f"{label:<18} bot {bot_cpu:7.2f}s  ffmpeg {ffmpeg_cpu:7.2f}s  "
+          f"{per_stream:6.2f}% of a core per stream  ({sum(frames)} frames)")
+
+
+if __name__ == "__main__":
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = sys.argv[3] if len(sys.argv) > 3 else make_test_file(tmp, seconds)
+        print(f"{streams} concurrent streams x {seconds}s")
+        run("pcm + loudnorm", pcm_source, url, streams, seconds)
+        run("opus passthrough", opus_source, url, streams, seconds)
@@ -0,0 +1,96 @@
+# BENCHMARK: RESIDENT MEMORY OF QUEUED SONGS - DICT-BACKED Song VS THE __slots__ Song
+# Run from the repo root:
+#   python benchmarks/bench_song_memory.py [guilds] [tracks per guild]
+# Each variant is built in its own interpreter so RSS deltas don't bleed into each other.
+import os
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from player import SongQueue
+from song import Song
+
+REQUESTERS = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"]
+
+
+class DictSong:
+    # THE OLD bot.Song - __dict__ PER INSTANCE, FULL URLS, NO INTERNING
+    def __init__(self, title, url, audio_url, duration, track=None, artist=None, requester=None, source="youtube", video_id=None, codec=None):
+        self.title = title
+        self.track = track
+        self.artist = artist
+        self.url = url
+        self.audio_url = audio_url
+        self.duration = duration
+        self.requester = requester
+        self.source = source
+        self.video_id = video_id
+        self.codec = codec
+
+
+def fake_info(guild, track):
+    video_id = f"{guild:04d}{track:07d}"
+    # SIGNED GOOGLEVIDEO URLS RUN ~1KB
+    stream = f"https://rr{track % 9}---sn-abc.googlevideo.com/videoplayback?expire=1790000000&id={video_id}&" + "x" * 950
+    return {
+        'id': video_id,
+        'title': f"Artist {track % 50} - Track {track} (Official Audio)",
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'url': stream,
+        'duration': 180 + track % 120,
+        'acodec': 'opus',
+    }
+
+
+def requester_name(i):
+    # A FRESH STRING PER MESSAGE, LIKE NAMES DECODED FROM GATEWAY PAYLOADS
+    return "".join(REQUESTERS[i % len(REQUESTERS)])
+
+
+def build(variant, guilds, tracks):
+    queues = {}
+    for guild in range(guilds):
+        queue = SongQueue()
+        for track in range(tracks):
+            info = fake_info(guild, track)
+            if variant == "dict":
+                song = DictSong(info['title'], info['webpage_url'], info['url'], info['duration'],
+                                requester=requester_name(track), source="".join("youtube"),
+                                video_id=info['id'], codec=info['acodec'])
+            else:
+                song = Song.from_youtube(info)
+                song.requester = requester_name(track)
+            queue.append(song)
+        queues[guild] = queue
+    return queues
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(variant, guilds, tracks):
+    rss_before = rss_kb()
+    tracemalloc.start()
+    queues = build(variant, guilds, tracks)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_kb()
+    print(f"{variant:<6} {len(queues) * tracks:>8} songs   traced {traced / 1024 ** 2:8.1f} MB   "
+          f"rss +{(rss_after - rss_before) / 1024:8.1f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--variant':
+        measure(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        guilds = sys.argv[1] if len(sys.argv) > 1 else '100'
+        tracks = sys.argv[2] if len(sys.argv) > 2 else '1000'
+        print(f"{guilds} guilds x {tracks} queued tracks")
+        for variant in ("dict", "slots"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--variant', variant, guilds, tracks], check=True)
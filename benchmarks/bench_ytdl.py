@@ -0,0 +1,93 @@
+# BENCHMARK: FRESH YoutubeDL PER QUERY VS THE WARM YDLPool
+# Run from the repo root:
+#   python benchmarks/bench_ytdl.py           (per-query setup overhead, no network)
+#   python benchmarks/bench_ytdl.py --live 8  (real searches, 8 concurrent guilds)
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import yt_dlp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from youtube import YDLPool
+
+YDL_OPTS = {
+    'format': 'bestaudio/best',
+    'quiet': True,
+    'default_search': 'ytsearch3',
+    'extract_flat': False,
+    'no_warnings': True,
+}
+ITERATIONS = 50
+QUERIES = [
+    "radiohead creep", "kendrick lamar humble", "anderson paak come down", "big krit country shit",
+    "daft punk one more time", "frank ocean nights", "tame impala let it happen", "outkast ms jackson",
+]
+
+
+def setup_fresh():
+    # WHAT query_youtube USED TO DO BEFORE EVERY SEARCH
+    with yt_dlp.YoutubeDL(YDL_OPTS) as ydl:
+        ydl.get_info_extractor('YoutubeSearch')
+        ydl.get_info_extractor('Youtube')
+
+
+def bench_overhead():
+    fresh = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        setup_fresh()
+        fresh.append(time.perf_counter() - start)
+
+    warm = yt_dlp.YoutubeDL(YDL_OPTS)
+    reused = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        warm.get_info_extractor('YoutubeSearch')
+        warm.get_info_extractor('Youtube')
+        reused.append(time.perf_counter() - start)
+    warm.close()
+
+    print(f"per-query setup, {ITERATIONS} iterations")
+    print(f"  fresh YoutubeDL   median {statistics.median(fresh) * 1000:8.3f} ms   first {fresh[0] * 1000:8.3f} ms")
+    print(f"  pooled YoutubeDL  median {statistics.median(reused) * 1e6:8.3f} us")
+
+
+async def bench_live(concurrency):
+    queries = [QUERIES[i % len(QUERIES)] for i in range(concurrency)]
+
+    async def fresh(query):
+        def run():
+            with yt_dlp.YoutubeDL(YDL_OPTS) as ydl:
+                return ydl.extract_info(query, download=False)
+        start = time.perf_counter()
+        await asyncio.to_thread(run)
+        return time.perf_counter() - start
+
+    pool = YDLPool(YDL_OPTS, max_workers=int(os.getenv('YTDL_WORKERS', '4')))
+
+    async def pooled(query):
+        start = time.perf_counter()
+        await pool.extract_info(query)
+        return time.perf_counter() - start
+
+    # WARM THE POOL SO EVERY WORKER HAS ITS INSTANCE
+    await asyncio.gather(*(pool.extract_info(q) for q in QUERIES[:pool.max_workers]))
+    pool.total_wait = pool.total_extract = 0.0
+    pool.completed = 0
+
+    for label, run in (("fresh", fresh), ("pooled", pooled)):
+        latencies = await asyncio.gather(*(run(q) for q in queries))
+        print(f"  {label:<7} median {statistics.median(latencies):6.2f} s   max {max(latencies):6.2f} s")
+    print(f"  pool stats: {pool.stats()}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    bench_overhead()
+    if len(sys.argv) > 1 and sys.argv[1] == '--live':
+        concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+        print(f"\nlive searches, {concurrency} concurrent")
+        asyncio.run(bench_live(concurrency))
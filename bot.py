@@ -3,60 +3,28 @@ from discord.ext import commands
 import os
 from dotenv import load_dotenv
 import asyncio
+import copy
 import random
-import yt_dlp
+import time
 import musicbrainz
 import lastfm
+import loudness
+import audio_cache
+import library
+from collections import OrderedDict
+from itertools import islice
+from rapidfuzz import fuzz, utils
+from player import GuildPlayer, PlayedHistory
+from song import Song
+import youtube
 
 
 ### DEFINITIONS ###
-# SONG DATA
-class Song:
-    def __init__(self, title, url, audio_url, duration, track=None, artist=None, requester=None, source="youtube"):
-        self.title = title # Youtube video title NOT the song title
-        self.track = track
-        self.artist = artist
-        self.url = url
-        self.audio_url = audio_url
-        self.duration = duration
-        self.requester = requester # May want to change this later but will just manually set in the discord command to separate logic
-        self.source = source
-    
-    @classmethod
-    def from_youtube(cls, info, song_name = None, artist_name = None):
-        return cls(
-            title=info['title'],
-            track = song_name,
-            artist = artist_name,
-            url=info['webpage_url'],
-            audio_url=info['url'],
-            duration=info['duration'],
-            # May want to change this later but will just manually set in the discord command to separate logic
-            #requester=requester,
-            source="youtube"
-        )
-    
-    @classmethod
-    # UNUSED
-    def from_local_file(cls, filepath, metadata, requester):
-        return cls(
-            title=metadata['title'],
-            url=filepath,
-            audio_url=filepath,
-            duration=metadata['duration'],
-            requester=requester,
-            source="local"
-        )
-    
-    def __str__(self):
-        return f"{self.title} ({self.source})"
-
 # SERVER SPECIFIC DATA STRUCTURES
 currently_playing = {}  # Current song
-music_queues = {}  # Manually played queue
-autoplay_queues = {}  # Autoplay queue - only loads 2 songs at a time
+players = {}  # Queues and autoplay state - guild_id -> GuildPlayer
 autoplay_enabled = {}  # Autoplay status
-autoplay_recommendations = {}  # Autoplay recs - full list for autoplay queue to pull from
+histories = {}  # Recently played songs - guild_id -> PlayedHistory, outlives the player so reconnects don't replay
 
 
 # YT_DLP
@@ -68,6 +36,13 @@ ydl_opts = {
     'no_warnings': True,
 }
 
+# PLAYLISTS ARE INGESTED FLAT - IDS, TITLES AND DURATIONS ONLY
+flat_ydl_opts = {
+    'quiet': True,
+    'extract_flat': 'in_playlist',
+    'no_warnings': True,
+}
+
 ### BOT ###
 # LOAD TOKEN FROM .ENV
 load_dotenv()
@@ -79,8 +54,69 @@ intents.message_content = True
 intents.voice_states = True
 
 bot = commands.Bot(command_prefix='/', intents=intents, help_command=None)
+
+# PLAYBACK MODE - "pcm" DECODES AND NORMALIZES IN FFMPEG THEN RE-ENCODES IN PYTHON
+# "opus" PREFERS OPUS/WEBM STREAMS AND HANDS DISCORD OPUS PACKETS DIRECTLY
+PLAYBACK_MODE = os.getenv('PLAYBACK_MODE', 'pcm')
+OPUS_LOUDNORM = os.getenv('OPUS_LOUDNORM', '0') == '1'  # Filtering in opus mode forces an FFmpeg re-encode
+FFMPEG_BEFORE_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+LOUDNORM_FILTER = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+
+if PLAYBACK_MODE == 'opus':
+    ydl_opts['format'] = 'bestaudio[acodec=opus]/bestaudio/best'
+
 mb_client = musicbrainz.MBClient()
 lastfm_client = lastfm.LastFMClient()
+ydl_pool = youtube.YDLPool(
+    ydl_opts,
+    max_workers=int(os.getenv('YTDL_WORKERS', '4')),
+    processes=os.getenv('YTDL_PROCESS_POOL', '0') == '1' # Opt-in - keeps extraction off the voice loop's GIL
+)
+flat_ydl_pool = youtube.YDLPool(flat_ydl_opts, max_workers=1)
+stream_cache = youtube.StreamCache(refresh_margin=int(os.getenv('STREAM_REFRESH_MARGIN', '1800')))
+stream_refreshes = {}  # video_id -> background refresh task
+
+# NEXT-TRACK PREFETCH
+PREFETCH_SECONDS = int(os.getenv('PREFETCH_SECONDS', '15'))  # How long before the current track ends
+PREFETCH_SOURCE = os.getenv('PREFETCH_SOURCE', '1') == '1'  # Also pre-spawn FFmpeg so it buffers ahead
+prefetch_tasks = {}  # guild_id -> prefetch task for the next song
+prepared_sources = {}  # guild_id -> (song, pre-spawned audio source)
+
+# PER-TRACK LOUDNESS - SET LOUDNESS_DB_PATH TO AN EMPTY STRING TO ALWAYS USE SINGLE-PASS LOUDNORM
+loudness_db_path = os.getenv('LOUDNESS_DB_PATH', 'logs/loudness.sqlite3')
+loudness_store = loudness.LoudnessStore(loudness_db_path) if loudness_db_path else None
+loudness_semaphore = asyncio.Semaphore(int(os.getenv('LOUDNESS_ANALYSIS_WORKERS', '1')))
+loudness_tasks = {}  # track key -> running analysis
+LOUDNESS_MAX_PENDING = int(os.getenv('LOUDNESS_MAX_PENDING', '20'))  # Backlog cap - extra tracks wait for a later play
+LOUDNESS_SEEN_SIZE = int(os.getenv('LOUDNESS_SEEN_SIZE', '5000'))
+loudness_seen = OrderedDict()  # Track keys played once - analysis waits for a second play
+
+# AUTOPLAY REFILLS
+AUTOPLAY_BUFFER_DEPTH = int(os.getenv('AUTOPLAY_BUFFER_DEPTH', '2'))  # Resolved songs kept ready per guild
+AUTOPLAY_RETRY_BUDGET = int(os.getenv('AUTOPLAY_RETRY_BUDGET', '5'))  # Unresolved recommendations before giving up on a seed
+autoplay_semaphore = asyncio.Semaphore(int(os.getenv('AUTOPLAY_RESOLVE_CONCURRENCY', '2')))
+HISTORY_SIZE = int(os.getenv('HISTORY_SIZE', '500'))  # Keys remembered per guild
+HISTORY_TTL = int(os.getenv('HISTORY_TTL', str(6 * 3600)))  # Seconds before a played song may come back
+IDENTIFY_MATCH_THRESHOLD = int(os.getenv('IDENTIFY_MATCH_THRESHOLD', '75'))  # Video title vs pipelined identification
+
+# ON-DISK OPUS CACHE FOR HOT TRACKS - SET AUDIO_CACHE_DIR TO AN EMPTY STRING TO ALWAYS STREAM
+audio_cache_dir = os.getenv('AUDIO_CACHE_DIR', 'logs/audio_cache')
+disk_cache = audio_cache.AudioCache(
+    audio_cache_dir,
+    max_bytes=int(os.getenv('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024,
+    min_plays=int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3')) # Plays within a week before a track is cached
+) if audio_cache_dir else None
+
+# LOCAL MUSIC LIBRARY - CHECKED BEFORE YOUTUBE WHEN LOCAL_LIBRARY_PATH IS SET
+LOCAL_LIBRARY_PATH = os.getenv('LOCAL_LIBRARY_PATH')
+LOCAL_LIBRARY_RESCAN = int(os.getenv('LOCAL_LIBRARY_RESCAN', '3600'))  # Seconds between incremental rescans
+local_library = library.LocalLibrary(
+    LOCAL_LIBRARY_PATH,
+    os.getenv('LOCAL_LIBRARY_INDEX', 'logs/library.sqlite3'),
+    workers=int(os.getenv('LOCAL_LIBRARY_WORKERS', '0')) or None,
+    threshold=int(os.getenv('LOCAL_LIBRARY_THRESHOLD', '85'))
+) if LOCAL_LIBRARY_PATH else None
+library_task = None
 
 ### METHODS ###
 def in_voice_channel():
@@ -92,22 +128,28 @@ def in_voice_channel():
     return commands.check(predicate)
 
 
+def get_player(guild_id):
+    if guild_id not in players:
+        players[guild_id] = GuildPlayer(guild_id)
+    return players[guild_id]
+
+
 def get_queue(guild_id):
-    if guild_id not in music_queues:
-        music_queues[guild_id] = []
-    return music_queues[guild_id]
+    return get_player(guild_id).queue
 
 
 def get_autoplay_queue(guild_id):
-    if guild_id not in autoplay_queues:
-        autoplay_queues[guild_id] = []
-    return autoplay_queues[guild_id]
+    return get_player(guild_id).autoplay_queue
+
+
+def get_history(guild_id):
+    if guild_id not in histories:
+        histories[guild_id] = PlayedHistory(HISTORY_SIZE, HISTORY_TTL)
+    return histories[guild_id]
 
 
 def get_autoplay_recommendations(guild_id):
-    if guild_id not in autoplay_recommendations:
-        autoplay_recommendations[guild_id] = []
-    return autoplay_recommendations[guild_id]
+    return get_player(guild_id).autoplay_recommendations
 
 
 def is_autoplay_enabled(guild_id):
@@ -116,158 +158,532 @@ def is_autoplay_enabled(guild_id):
 
 async def fetch_autoplay_recommendations(ctx, mbid, artist, track):
     if not mbid:
-        return False
+        return []
     
     # GET RECOMMENDATIONS FROM LAST FM
-    recommendations = lastfm_client.get_recommendations(mbid, artist, track, 25)
+    recommendations = await lastfm_client.get_recommendations(mbid, artist, track, 25)
     
     if not recommendations:
-        return False
+        return []
     
+    # DROP ANYTHING THE GUILD HEARD RECENTLY BEFORE IT COSTS A YOUTUBE LOOKUP
+    history = get_history(ctx.guild.id)
+    recommendations = [rec for rec in recommendations if not history.played(rec['artist'], rec['title'], rec.get('mbid'))]
     random.shuffle(recommendations)
     
-    # STORE RECOMMENDATIONS
-    rec_list = get_autoplay_recommendations(ctx.guild.id)
+    print(f"Fetched {len(recommendations)} recommendations from Last.fm")
+    return recommendations
+
+
+def store_autoplay_recommendations(guild_id, recommendations):
+    rec_list = get_autoplay_recommendations(guild_id)
     rec_list.clear()
     rec_list.extend(recommendations)
-    
-    print(f"Fetched {len(recommendations)} recommendations from Last.fm")
-    return True
 
 
-async def load_next_autoplay_song(ctx):
-    rec_list = get_autoplay_recommendations(ctx.guild.id)
-    autoplay_queue = get_autoplay_queue(ctx.guild.id)
-    
+async def resolve_recommendation(rec):
+    # SHARED SEMAPHORE - AUTOPLAY REFILLS ACROSS ALL GUILDS NEVER CROWD OUT /play SEARCHES IN THE YTDL POOL
+    async with autoplay_semaphore:
+        yt_results = await query_youtube(f"{rec['artist']} {rec['title']}", rec['title'], rec['artist'])
+    return yt_results[0] if yt_results else None
+
+
+async def autoplay_producer(player):
+    rec_list = player.autoplay_recommendations
+    history = get_history(player.guild_id)
+    misses = 0
+
+    # BOUNDED - STOPS ONCE RECOMMENDATIONS RUN OUT OR TOO MANY FAIL TO RESOLVE
+    while rec_list and misses < AUTOPLAY_RETRY_BUDGET:
+        missing = AUTOPLAY_BUFFER_DEPTH - len(player.autoplay_queue)
+        if missing <= 0:
+            player.autoplay_wanted.clear()
+            await player.autoplay_wanted.wait()
+            continue
+
+        # RESOLVE THE WHOLE SHORTFALL AT ONCE - SKIPPING ANYTHING PLAYED SINCE THE SEED WAS FETCHED
+        recs = []
+        while rec_list and len(recs) < missing:
+            rec = rec_list.popleft()
+            if not history.played(rec['artist'], rec['title'], rec.get('mbid')):
+                recs.append(rec)
+        songs = await asyncio.gather(*(resolve_recommendation(rec) for rec in recs))
+
+        # QUEUED IN RECOMMENDATION ORDER - A DIFFERENT NAME FOR A VIDEO WE JUST PLAYED COUNTS AS A MISS
+        async with player.lock:
+            for song in songs:
+                if song and not history.played(video_id=song.video_id):
+                    song.requester = "Autoplay"
+                    player.autoplay_queue.append(song)
+                else:
+                    misses += 1
+
+        # NOTHING PLAYING (E.G. THE REQUESTED SONG ALREADY ENDED) - START THE FIRST AUTOPLAY SONG
+        await advance(player)
+
     if not rec_list:
         print("No autoplay recommendations available")
-        return None
-    
-    rec = rec_list.pop(0)
-    rec_search = f"{rec['artist']} {rec['title']}"
+    else:
+        print(f"Autoplay stopped after {misses} unresolved recommendations")
 
-    # QUERY YOUTUBE FOR REC AND ADD TO AUTOPLAY QUEUE
-    yt_results = await query_youtube(rec_search, rec['title'], rec['artist'])
-    if yt_results:
-        song = yt_results[0]
-        song.requester = "Autoplay"
-        autoplay_queue.append(song)
 
-    # RETRY WITH NEXT SONG IF NOT FOUND
-    else:
-        await load_next_autoplay_song(ctx)
+def start_autoplay(player):
+    # NEW SEED - DROP WHATEVER THE OLD PRODUCER HAD BUFFERED
+    if player.autoplay_task:
+        player.autoplay_task.cancel()
+    player.autoplay_queue.clear()
+    revalidate_prepared_source(player.guild_id)
+    player.autoplay_wanted.set()
+    player.autoplay_task = asyncio.create_task(autoplay_producer(player))
 
 
 async def query_youtube(search_query, song_name = None, artist_name = None):
     # TODO CLEAN UP THE ARGUMENTS FOR THIS - THROWING THESE IN HERE TO ALLOW SONG - ARTIST DATA ON AUTOPLAY SONGS
     try:
-        # YOUTUBE SEARCH
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            yt_info = await asyncio.to_thread(ydl.extract_info, search_query, False)
-
-            # DIRECT VIDEO LINK
-            if not 'entries' in yt_info:
-                song = Song.from_youtube(yt_info)
-                return [song]
-
-            # PLAYLIST
-            if len(yt_info['entries']) > 3: # Not the best logic but I imagine any playlists linked will have more than 3 songs, ytsearch3 returns 3 entries always
-                
-                # RETRIVE ALL SONG DATA
-                playlist = []
-                for entry in yt_info['entries']:
-                    if entry:
-                        song = Song.from_youtube(entry)
-                        playlist.append(song)
-                
+        # PLAYLIST LINK - FLAT LISTING ONLY, EACH STREAM IS RESOLVED WHEN IT'S ABOUT TO PLAY
+        if is_playlist_url(search_query):
+            yt_info = await flat_ydl_pool.extract_info(search_query)
+            playlist = [Song.from_flat_entry(entry) for entry in yt_info.get('entries', []) if entry and entry.get('id')]
+            if playlist:
                 return playlist
 
-            # SINGLE VIDEO
-            elif not ('youtube.com' in search_query or 'youtu.be' in search_query):
-                # FILTER OUT MUSIC VIDEOS
-                filtered_entries = [
-                    entry for entry in yt_info['entries']
-                    if entry 
-                    and '(clean)' not in entry.get('title', '').lower()
-                    and 'clean version' not in entry.get('title', '').lower()
-                    and 'album' not in entry.get('title', '').lower()
-                    and (
-                        # Allow if it contains "lyrics" or "lyric"
-                        'lyric' in entry.get('title', '').lower()
-                        or (
-                            # Otherwise, exclude these patterns
-                            'music video' not in entry.get('title', '').lower()
-                            and 'official video' not in entry.get('title', '').lower()
-                            and not ('official' in entry.get('title', '').lower() and 'video' in entry.get('title', '').lower())
-                        )
+        # DIRECT VIDEO LINK WITH A STILL-VALID CACHED STREAM - NO EXTRACTION
+        video_id = youtube.video_id_from_url(search_query) if 'youtu' in search_query else None
+        cached = stream_cache.get(video_id) if video_id else None
+        if cached:
+            return [Song.from_youtube(cached, song_name, artist_name)]
+
+        # YOUTUBE SEARCH - WARM EXTRACTOR FROM THE POOL
+        yt_info = await ydl_pool.extract_info(search_query)
+
+        # DIRECT VIDEO LINK
+        if not 'entries' in yt_info:
+            stream_cache.put(yt_info)
+            song = Song.from_youtube(yt_info)
+            return [song]
+
+        for entry in yt_info['entries']:
+            stream_cache.put(entry)
+
+        # PLAYLIST
+        if len(yt_info['entries']) > 3: # Not the best logic but I imagine any playlists linked will have more than 3 songs, ytsearch3 returns 3 entries always
+            
+            # RETRIVE ALL SONG DATA
+            playlist = []
+            for entry in yt_info['entries']:
+                if entry:
+                    song = Song.from_youtube(entry)
+                    playlist.append(song)
+            
+            return playlist
+
+        # SINGLE VIDEO
+        elif not ('youtube.com' in search_query or 'youtu.be' in search_query):
+            # FILTER OUT MUSIC VIDEOS
+            filtered_entries = [
+                entry for entry in yt_info['entries']
+                if entry 
+                and '(clean)' not in entry.get('title', '').lower()
+                and 'clean version' not in entry.get('title', '').lower()
+                and 'album' not in entry.get('title', '').lower()
+                and (
+                    # Allow if it contains "lyrics" or "lyric"
+                    'lyric' in entry.get('title', '').lower()
+                    or (
+                        # Otherwise, exclude these patterns
+                        'music video' not in entry.get('title', '').lower()
+                        and 'official video' not in entry.get('title', '').lower()
+                        and not ('official' in entry.get('title', '').lower() and 'video' in entry.get('title', '').lower())
                     )
-                ]
-                best_entry = filtered_entries[0] if filtered_entries else yt_info['entries'][0]
-                song = Song.from_youtube(best_entry, song_name, artist_name)
-                return [song]
+                )
+            ]
+            best_entry = filtered_entries[0] if filtered_entries else yt_info['entries'][0]
+            song = Song.from_youtube(best_entry, song_name, artist_name)
+            return [song]
     except Exception as e:
         print(f"Error querying YouTube: {e}")
         return None
 
 
-async def play_song(ctx, song, from_autoplay=False):
-    voice_client = ctx.voice_client
-    audio_source = discord.FFmpegPCMAudio(
+async def search_local_library(search_query, requester):
+    # NO NETWORK, NO EXTRACTION - BUT A FUZZY PASS OVER A LARGE LIBRARY IS TOO SLOW FOR THE EVENT LOOP
+    if not local_library or 'youtube.com' in search_query or 'youtu.be' in search_query:
+        return None, None
+    track = await asyncio.to_thread(local_library.search, search_query)
+    if not track:
+        return None, None
+
+    song = Song.from_local_file(track['path'], track, requester)
+    song.track = track['title']
+    song.artist = track['artist']
+
+    # TAGGED FILES ARE ALREADY IDENTIFIED - MBID TAGS ALSO SEED AUTOPLAY
+    mb_results = {'artist': track['artist'], 'track': track['title'], 'mbid': track['mbid']} if track['artist'] else None
+    return song, mb_results
+
+
+async def rescan_local_library():
+    while True:
+        try:
+            await local_library.scan_async()
+        except Exception as e:
+            print(f"Error scanning local library: {e}")
+        await asyncio.sleep(LOCAL_LIBRARY_RESCAN)
+
+
+def is_playlist_url(search_query):
+    return ('youtube.com' in search_query or 'youtu.be' in search_query) and 'list=' in search_query
+
+
+async def resolve_stream(song):
+    # JUST-IN-TIME STREAM URL FOR SONGS QUEUED FROM A FLAT PLAYLIST OR WITH AN EXPIRED URL
+    info = await ydl_pool.extract_info(song.url)
+    stream_cache.put(info)
+    song.audio_url = info['url']
+    song.duration = info.get('duration') or song.duration
+    song.codec = info.get('acodec')
+    return song
+
+
+async def refresh_stream(video_id, url):
+    try:
+        stream_cache.put(await ydl_pool.extract_info(url))
+        print(f"Refreshed stream URL for {video_id}")
+    except Exception as e:
+        print(f"Error refreshing stream URL for {video_id}: {e}")
+    finally:
+        stream_refreshes.pop(video_id, None)
+
+
+async def ensure_stream(song):
+    # URL MUST OUTLIVE THE SONG ITSELF (PLUS A MINUTE) SO FFMPEG'S RECONNECTS KEEP WORKING
+    min_ttl = (song.duration or 0) + 60
+
+    if song.video_id:
+        cached = stream_cache.get(song.video_id, min_ttl)
+        if cached:
+            song.audio_url = cached['url']
+            song.codec = cached.get('acodec')
+        elif song.audio_url and youtube.stream_expiry(song.audio_url) - time.time() > min_ttl:
+            stream_cache.put({'id': song.video_id, 'title': song.title, 'webpage_url': song.url, 'url': song.audio_url, 'duration': song.duration, 'acodec': song.codec})
+        else:
+            await resolve_stream(song)
+
+        # REFRESH IN THE BACKGROUND SHORTLY BEFORE EXPIRY SO THE NEXT PLAY SKIPS EXTRACTION
+        if stream_cache.expiring_soon(song.video_id) and song.video_id not in stream_refreshes:
+            stream_refreshes[song.video_id] = asyncio.create_task(refresh_stream(song.video_id, song.url))
+
+    elif not song.audio_url:
+        await resolve_stream(song)
+
+    return song
+
+
+def loudness_key(song):
+    return song.video_id or song.url
+
+
+def audio_filter(song):
+    # MEASURED TRACKS GET A CHEAP LINEAR GAIN - UNMEASURED ONES FALL BACK TO DYNAMIC SINGLE-PASS LOUDNORM
+    stats = loudness_store.get(loudness_key(song)) if loudness_store else None
+    return loudness.gain_filter(stats) if stats else LOUDNORM_FILTER
+
+
+async def analyze_loudness(song):
+    key = loudness_key(song)
+    before_options = FFMPEG_BEFORE_OPTIONS if song.source != "local" else None
+    try:
+        async with loudness_semaphore:
+            stats = await loudness.analyze(song.audio_url, before_options)
+        if stats:
+            loudness_store.put(key, stats)
+            print(f"Measured loudness for {song}: {stats['input_i']} LUFS")
+    except Exception as e:
+        print(f"Error analyzing loudness for {song}: {e}")
+    finally:
+        loudness_tasks.pop(key, None)
+
+
+def schedule_loudness_analysis(song):
+    # SECOND PLAY OF A TRACK - MEASURE IT IN THE BACKGROUND SO LATER PLAYS CAN SKIP DYNAMIC LOUDNORM
+    key = loudness_key(song)
+    if not loudness_store or not song.audio_url or key in loudness_tasks or loudness_store.get(key):
+        return
+
+    # MOST TRACKS ARE ONLY EVER PLAYED ONCE - DECODING THEM A SECOND TIME FOR ANALYSIS WOULD JUST COST CPU
+    if key not in loudness_seen:
+        loudness_seen[key] = True
+        while len(loudness_seen) > LOUDNESS_SEEN_SIZE:
+            loudness_seen.popitem(last=False)
+        return
+
+    # BOUNDED BACKLOG - EACH PENDING ANALYSIS HOLDS A SIGNED URL THAT MAY EXPIRE WHILE IT WAITS
+    if len(loudness_tasks) >= LOUDNESS_MAX_PENDING:
+        return
+    loudness_seen.pop(key, None)
+    loudness_tasks[key] = asyncio.create_task(analyze_loudness(song))
+
+
+async def local_copy(song):
+    # HOT TRACKS PLAY FROM THE DISK CACHE - NO EXTRACTION AND NO THROTTLED GOOGLEVIDEO STREAM
+    if not disk_cache or song.source != "youtube" or not song.video_id:
+        return None
+    # SQLITE WRITE + FSYNC - KEPT OFF THE EVENT LOOP SO VOICE PACKETS DON'T STALL
+    path = await asyncio.to_thread(disk_cache.lookup, song.video_id)
+    if not path:
+        return None
+    metadata = {'title': song.title, 'duration': song.duration, 'video_id': song.video_id, 'codec': 'opus'}
+    return Song.from_local_file(path, metadata, song.requester)
+
+
+async def playable(song):
+    # WHAT FFMPEG SHOULD ACTUALLY OPEN - THE CACHED FILE IF THERE IS ONE, OTHERWISE A FRESH STREAM URL
+    local = await local_copy(song)
+    if local:
+        return local
+    if song.source == "youtube":
+        await ensure_stream(song)
+    return song
+
+
+async def record_play(song):
+    # PLAY-COUNT ADMISSION - ONLY TRACKS THAT KEEP COMING BACK ARE WORTH THE DISK SPACE
+    if not disk_cache or song.source != "youtube" or not song.video_id:
+        return
+    if await asyncio.to_thread(disk_cache.record_play, song.video_id) and song.audio_url:
+        disk_cache.schedule_download(song.video_id, song.audio_url, song.codec, FFMPEG_BEFORE_OPTIONS)
+
+
+def create_audio_source(song):
+    # RECONNECT FLAGS ONLY MEAN SOMETHING FOR HTTP STREAMS
+    before_options = FFMPEG_BEFORE_OPTIONS if song.source != "local" else None
+
+    if PLAYBACK_MODE == 'opus':
+        # NO FILTER AND ALREADY OPUS - COPY PACKETS THROUGH WITH NO DECODE OR ENCODE AT ALL
+        if song.codec == 'opus' and not OPUS_LOUDNORM:
+            return discord.FFmpegOpusAudio(song.audio_url, codec='copy', before_options=before_options, options='-vn')
+
+        # OTHERWISE FFMPEG ENCODES OPUS ITSELF - STILL NO PCM ROUND TRIP THROUGH PYTHON
+        options = f'-vn -af "{audio_filter(song)}"' if OPUS_LOUDNORM else '-vn'
+        return discord.FFmpegOpusAudio(song.audio_url, before_options=before_options, options=options)
+
+    return discord.FFmpegPCMAudio(
         song.audio_url,
-        before_options='-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-        options='-vn -af "loudnorm=I=-16:TP=-1.5:LRA=11"'
+        before_options=before_options,
+        options=f'-vn -af "{audio_filter(song)}"'
     )
-    
-    # CALLBACK - TRIGGERS AFTER PLAY_SONG FINISHES
+
+
+def peek_next_song(guild_id):
+    queue = get_queue(guild_id)
+    if queue:
+        return queue[0]
+    if is_autoplay_enabled(guild_id):
+        autoplay_queue = get_autoplay_queue(guild_id)
+        if autoplay_queue:
+            return autoplay_queue[0]
+    return None
+
+
+def discard_prepared_source(guild_id):
+    prepared = prepared_sources.pop(guild_id, None)
+    if prepared:
+        prepared[1].cleanup()
+
+
+def revalidate_prepared_source(guild_id):
+    # QUEUE EDITS CAN CHANGE THE HEAD - A SOURCE PREPARED FOR ANY OTHER SONG WOULD KEEP ITS FFMPEG ALIVE
+    prepared = prepared_sources.get(guild_id)
+    if prepared and prepared[0] is not peek_next_song(guild_id):
+        discard_prepared_source(guild_id)
+
+
+def take_prepared_source(guild_id, song):
+    # ONLY VALID IF THE QUEUE HEAD DIDN'T CHANGE SINCE IT WAS PREPARED
+    prepared = prepared_sources.get(guild_id)
+    if prepared and prepared[0] is song:
+        del prepared_sources[guild_id]
+        return prepared[1]
+    discard_prepared_source(guild_id)
+    return None
+
+
+def cancel_prefetch(guild_id):
+    task = prefetch_tasks.pop(guild_id, None)
+    if task:
+        task.cancel()
+    discard_prepared_source(guild_id)
+
+
+async def prefetch_next_song(guild_id, delay):
+    await asyncio.sleep(max(delay, 0))
+    next_song = peek_next_song(guild_id)
+    if not next_song:
+        return
+
+    try:
+        # VALIDATE / REFRESH THE STREAM URL AHEAD OF TIME - CACHED TRACKS SKIP IT ENTIRELY
+        target = await playable(next_song)
+
+        # PRE-SPAWN FFMPEG - IT CONNECTS AND FILLS ITS PIPE WHILE THE CURRENT SONG FINISHES
+        if PREFETCH_SOURCE and peek_next_song(guild_id) is next_song:
+            discard_prepared_source(guild_id)
+            prepared_sources[guild_id] = (next_song, create_audio_source(target))
+        print(f"Prefetched next song: {next_song}")
+    except Exception as e:
+        print(f"Error prefetching {next_song}: {e}")
+
+
+def schedule_prefetch(guild_id, song):
+    task = prefetch_tasks.pop(guild_id, None)
+    if task:
+        task.cancel()
+    delay = (song.duration or 0) - PREFETCH_SECONDS
+    prefetch_tasks[guild_id] = asyncio.create_task(prefetch_next_song(guild_id, delay))
+
+
+async def open_source(song):
+    # LOCAL COPY OR FRESH STREAM URL - LAZY PLAYLIST ENTRIES AND EXPIRED URLS ARE RESOLVED HERE
+    try:
+        return create_audio_source(await playable(song))
+    except Exception as e:
+        print(f"Error resolving stream for {song}: {e}")
+        return None
+
+
+def play_song(player, song, audio_source):
+    # STARTS ONE SONG - ONLY CALLED FROM advance() WITH THE PLAYER LOCK HELD, NOTHING HERE AWAITS
+    guild_id = player.guild_id
+
+    # CALLBACK - RUNS ON DISCORD'S AUDIO THREAD, SO IT ONLY HANDS THE EVENT TO THE PLAYER TASK
     def after_playing(error):
-        if error:
-            print(f"[after_playing] Playback error: {error}")  # at least log it
-            asyncio.run_coroutine_threadsafe(
-                ctx.send(embed=create_embed("Playback Error", str(error), discord.Color.red())),
-                bot.loop
-            )
-        
-        queue = get_queue(ctx.guild.id)
-        
-        # PLAY NEXT SONG IN MANUAL QUEUE
-        if queue:
-            next_song = queue.pop(0)
-            asyncio.run_coroutine_threadsafe(
-                play_song(ctx, next_song), 
-                bot.loop
-            )
+        bot.loop.call_soon_threadsafe(player.events.put_nowait, (song, error))
 
-        # PLAY NEXT SONG IN AUTOPLAY QUEUE
-        elif is_autoplay_enabled(ctx.guild.id):
-            autoplay_queue = get_autoplay_queue(ctx.guild.id)
-            if autoplay_queue:
-                next_song = autoplay_queue.pop(0)
-                
-                # PLAY SONG
-                asyncio.run_coroutine_threadsafe(
-                    play_song(ctx, next_song), 
-                    bot.loop
-                )
+    player.ctx.voice_client.play(audio_source, after=after_playing)
+    currently_playing[guild_id] = song
+    get_history(guild_id).record(song)
 
-                # SEND EMBED
-                asyncio.run_coroutine_threadsafe(
-                    ctx.send(embed=create_song_embed(ctx, next_song)),
-                    bot.loop
-                )
+    # GET THE NEXT SONG READY A FEW SECONDS BEFORE THIS ONE ENDS
+    schedule_prefetch(guild_id, song)
 
-                # REPLENISH AUTOPLAY QUEUE
-                if len(autoplay_queue) < 2:
-                    asyncio.run_coroutine_threadsafe(
-                        load_next_autoplay_song(ctx),
-                        bot.loop
-                    )
-            else:
-                currently_playing[ctx.guild.id] = None
-        else:
-            currently_playing[ctx.guild.id] = None
-    
-    voice_client.play(audio_source, after=after_playing)
-    currently_playing[ctx.guild.id] = song
+
+async def song_started(song):
+    # COUNT THE PLAY - POPULAR TRACKS GET DOWNLOADED TO THE DISK CACHE IN THE BACKGROUND
+    await record_play(song)
+
+    # MEASURE LOUDNESS ONCE SO REPLAYS USE A LINEAR GAIN
+    if PLAYBACK_MODE != 'opus' or OPUS_LOUDNORM:
+        schedule_loudness_analysis(song)
+
+
+def pop_next_song(player):
+    # MANUAL QUEUE FIRST, THEN AUTOPLAY
+    if player.queue:
+        return player.queue.popleft(), False
+    if is_autoplay_enabled(player.guild_id) and player.autoplay_queue:
+        return player.autoplay_queue.popleft(), True
+    return None, False
+
+
+async def advance(player):
+    # THE ONLY PLACE A TRACK STARTS - NO-OP IF SOMETHING IS ALREADY PLAYING OR STARTING
+    ctx = player.ctx
+    guild_id = player.guild_id
+    failed = []
+    song, from_autoplay, audio_source = None, False, None
+    claimed = False
+
+    try:
+        while True:
+            # PICK THE NEXT SONG UNDER THE LOCK - QUEUE EDITS ONLY EVER WAIT FOR THIS PART
+            async with player.lock:
+                voice_client = ctx.voice_client
+                if not voice_client or voice_client.is_playing() or currently_playing.get(guild_id) or (player.starting and not claimed):
+                    song = None
+                    break
+
+                song, from_autoplay = pop_next_song(player)
+
+                # QUEUE RAN DRY - NOTHING WILL EVER TAKE A SOURCE PREPARED FOR A SONG THAT WAS REMOVED
+                if song is None:
+                    discard_prepared_source(guild_id)
+                    break
+
+                # PREFETCHED SOURCE IS ALREADY CONNECTED AND BUFFERED - TAKEN BEFORE A QUEUE EDIT CAN DISCARD IT
+                player.starting = claimed = True
+                audio_source = take_prepared_source(guild_id, song)
+
+            # STREAM RESOLUTION CAN BE A FULL EXTRACTION - DONE WITHOUT THE LOCK, OTHER ADVANCES SEE player.starting
+            if audio_source is None:
+                audio_source = await open_source(song)
+            if audio_source is None:
+                # SKIP PAST SONGS THAT WON'T LOAD
+                failed.append(song)
+                continue
+
+            async with player.lock:
+                # STOPPED OR DISCONNECTED WHILE THE STREAM RESOLVED
+                voice_client = ctx.voice_client
+                if players.get(guild_id) is not player or not voice_client or voice_client.is_playing():
+                    song = None
+                    break
+                play_song(player, song, audio_source)
+                audio_source = None
+            break
+    finally:
+        if claimed:
+            player.starting = False
+        # RESOLVED BUT NEVER PLAYED - DON'T LEAVE ITS FFMPEG RUNNING
+        if audio_source is not None:
+            audio_source.cleanup()
+
+    if song:
+        await song_started(song)
+
+    # EMBEDS GO OUT ONCE THE NEXT TRACK IS ALREADY PLAYING
+    for failed_song in failed:
+        await ctx.send(embed=create_embed("Playback Error", f"Couldn't load {failed_song.title}", discord.Color.red()))
+
+    if song and from_autoplay:
+        # REPLENISH AUTOPLAY QUEUE
+        player.autoplay_wanted.set()
+        await ctx.send(embed=create_song_embed(ctx, song))
+
+
+async def run_player(player):
+    while True:
+        song, error = await player.events.get()
+        try:
+            # STALE EVENT FROM A TRACK THAT WAS ALREADY REPLACED
+            if song is not currently_playing.get(player.guild_id):
+                continue
+            currently_playing[player.guild_id] = None
+
+            await advance(player)
+
+            if error:
+                print(f"[run_player] Playback error: {error}")
+                await player.ctx.send(embed=create_embed("Playback Error", str(error), discord.Color.red()))
+        except Exception as e:
+            print(f"Error in player for guild {player.guild_id}: {e}")
+
+
+def start_player(ctx):
+    # ONE LONG-LIVED TASK PER GUILD OWNS EVERY TRACK TRANSITION
+    player = get_player(ctx.guild.id)
+    player.ctx = ctx
+    if player.task is None or player.task.done():
+        player.task = asyncio.create_task(run_player(player))
+    return player
+
+
+def stop_player(guild_id):
+    player = players.pop(guild_id, None)
+    if not player:
+        return
+    for task in (player.task, player.autoplay_task, player.identify_task):
+        if task:
+            task.cancel()
 
 
 ### MESSAGE EMBEDS
@@ -282,7 +698,7 @@ def create_embed(title, description=None, color=discord.Color.blue(), footer=Non
     return embed
 
 
-def create_song_embed(ctx, song, mb_results=None):
+def create_song_embed(ctx, song, mb_results=None, identifying=False):
     
     queue = get_queue(ctx.guild.id)
     autoplay_enabled = is_autoplay_enabled(ctx.guild.id)
@@ -290,7 +706,7 @@ def create_song_embed(ctx, song, mb_results=None):
 
     embed = discord.Embed(
         title='Track Queued' if not from_autoplay else "Autoplaying Next Song",
-        description=f'[{song.title}]({song.url})',
+        description=song.link(),
         color=discord.Color.green(),
         timestamp=discord.utils.utcnow()
     )
@@ -309,16 +725,16 @@ def create_song_embed(ctx, song, mb_results=None):
         embed.add_field(name="Position in Queue", value=f"#{len(queue)}", inline=True)
 
         # TIME UNTL PLAY
-        time_until = sum(s.duration for s in queue[:-1])
-        if ctx.guild.id in currently_playing and queue:
-            time_until += currently_playing[ctx.guild.id].duration
+        time_until = queue.start_of(len(queue) - 1)
+        current = currently_playing.get(ctx.guild.id)
+        if current:
+            time_until += current.duration
             time_until_str = f"{time_until // 60}:{time_until % 60:02d}"
             embed.add_field(name="Estimated Start", value=time_until_str, inline=True)
 
     # AUTOPLAY STATUS - TODO ADD MORE INFO ON FAILURES
     if autoplay_enabled and not from_autoplay:
-        response_text = "✅ Autoplaying from this track" if mb_results else "❌ Failed to identify artist/track"
-        embed.add_field(name="Autoplay", value=response_text, inline=True)
+        embed.add_field(name="Autoplay", value=autoplay_status(mb_results, identifying), inline=True)
     
     # REQUESTER
     embed.set_footer(text=f"Requested by {song.requester}" if not from_autoplay else "Provided by last.fm")
@@ -326,6 +742,38 @@ def create_song_embed(ctx, song, mb_results=None):
     return embed
 
 
+def autoplay_status(mb_results, identifying=False):
+    if identifying:
+        return "⏳ Identifying artist/track..."
+    return "✅ Autoplaying from this track" if mb_results else "❌ Failed to identify artist/track"
+
+
+def matches_video(song, mb_results):
+    # PIPELINED IDENTIFICATION RAN ON THE RAW QUERY - ONLY TRUST IT IF IT DESCRIBES THE VIDEO YOUTUBE PICKED
+    if not mb_results:
+        return None
+    # TRACK MUST APPEAR IN THE TITLE, ARTIST IN THE TITLE OR THE UPLOADER ("Kendrick Lamar - Topic" UPLOADS)
+    title = utils.default_process(song.title or '')
+    artist = utils.default_process(mb_results['artist'])
+    score = min(
+        fuzz.partial_ratio(utils.default_process(mb_results['track']), title, processor=None),
+        max(fuzz.partial_ratio(artist, text, processor=None) for text in (title, utils.default_process(song.uploader or '')))
+    )
+    if score < IDENTIFY_MATCH_THRESHOLD:
+        print(f"Ignoring identification {mb_results['artist']} - {mb_results['track']} for {song.title} ({score:.0f})")
+        return None
+    return mb_results
+
+
+def set_identification(embed, mb_results):
+    # LATE MUSICBRAINZ RESULT - PATCH THE SENT EMBED IN PLACE SO QUEUE POSITION ETC. STAY AS THEY WERE
+    if mb_results:
+        embed.insert_field_at(0, name="Identified As", value=f"`{mb_results['artist']} - {mb_results['track']}`", inline=False)
+    for i, field in enumerate(embed.fields):
+        if field.name == "Autoplay":
+            embed.set_field_at(i, name="Autoplay", value=autoplay_status(mb_results), inline=True)
+
+
 def create_playlist_embed(playlist_title, song_count, first_song, duration):
     embed = discord.Embed(
         title="Playlist Queued",
@@ -342,7 +790,7 @@ def create_playlist_embed(playlist_title, song_count, first_song, duration):
     embed.add_field(name="Duration", value=duration_str, inline=True)
     
     # FIRST TRACK INFO
-    embed.add_field(name="First Track", value=f"[{first_song.title}]({first_song.url})", inline=False)
+    embed.add_field(name="First Track", value=first_song.link(), inline=False)
 
     # REQUESTER
     embed.set_footer(text=f"Requested by {first_song.requester}")
@@ -353,8 +801,13 @@ def create_playlist_embed(playlist_title, song_count, first_song, duration):
 ### EVENTS ###
 @bot.event
 async def on_ready():
+    global library_task
     print(f'{bot.user} has connected to Discord!')
 
+    # ON_READY FIRES AGAIN ON RECONNECTS - ONLY EVER START ONE SCANNER
+    if local_library and library_task is None:
+        library_task = asyncio.create_task(rescan_local_library())
+
 
 ### COMMANDS ###
 @bot.command()
@@ -367,16 +820,14 @@ async def ping(ctx):
 @in_voice_channel()
 async def disconnect(ctx):
     if ctx.voice_client:
+        # STOP THE PLAYER TASK FIRST SO THE FINISHED EVENT DOESN'T START ANOTHER TRACK
+        # DROPS THE GUILD'S QUEUES ENTIRELY - NOTHING LINGERS FOR GUILDS THE BOT HAS LEFT
+        stop_player(ctx.guild.id)
+        cancel_prefetch(ctx.guild.id)
         if ctx.voice_client.is_playing():
             ctx.voice_client.stop()
         
-        queue = get_queue(ctx.guild.id)
-        queue.clear()
-        autoplay_queue = get_autoplay_queue(ctx.guild.id)
-        autoplay_queue.clear()
-        
-        if ctx.guild.id in currently_playing:
-            currently_playing[ctx.guild.id] = None
+        currently_playing.pop(ctx.guild.id, None)
         
         await ctx.voice_client.disconnect()
         await ctx.send("DISCONNECTING! LATER DOOOOOOOOG!")
@@ -399,18 +850,42 @@ async def play(ctx, *, search):
         await ctx.send(embed=create_embed("Error", "Failed to connect to voice channel.", discord.Color.red()))
         return
 
-    queue = get_queue(ctx.guild.id)
+    player = start_player(ctx)
+    queue = player.queue
+    history = get_history(ctx.guild.id)
+
+    # LOCAL LIBRARY FIRST
+    identify_task = None
+    local_song, mb_results = await search_local_library(search, ctx.author.name)
+    if local_song:
+        yt_results = [local_song]
+
+    # SAME REQUEST AS A RECENT ONE - REUSE THE RESOLVED SONG, NO SEARCH OR IDENTIFICATION
+    elif reused := history.find(search):
+        previous, mbid = reused
+        yt_results = [copy.copy(previous)]
+        if mbid:
+            mb_results = {'artist': previous.artist, 'track': previous.track, 'mbid': mbid}
 
-    # QUERY MUSICBRAINZ TO GET METADATA
-    mb_results = None
-    if not ('youtube.com' in search or 'youtu.be' in search):
-        mb_results = await mb_client.song_search_async(search)
-        # UPDATE SEARCH WITH ACCURATE ARTIST AND TITLE
-        if mb_results:
-            search = f'{mb_results['artist']} - {mb_results['track']}'
+    # LINKS SKIP IDENTIFICATION
+    elif 'youtube.com' in search or 'youtu.be' in search:
+        yt_results = await query_youtube(search)
+
+    else:
+        # PIPELINED - SEARCH THE RAW QUERY WHILE MUSICBRAINZ IDENTIFIES IT
+        identify_task = asyncio.create_task(mb_client.song_search_async(search))
+        yt_results = await query_youtube(search)
+
+        # RAW QUERY FOUND NOTHING - RETRY WITH THE ACCURATE ARTIST AND TITLE
+        if not yt_results:
+            mb_results = await identify_task
+            identify_task = None
+            if mb_results:
+                yt_results = await query_youtube(f'{mb_results['artist']} - {mb_results['track']}')
+        elif identify_task.done():
+            mb_results = matches_video(yt_results[0], identify_task.result())
+            identify_task = None
 
-    # QUERY YOUTUBE
-    yt_results = await query_youtube(search)
     if not yt_results:
         await ctx.send(embed=create_embed("Error", "No song found for that request!", discord.Color.red()))
         return
@@ -422,51 +897,77 @@ async def play(ctx, *, search):
         total_duration = 0
 
         # ADD SONGS
-        for song in yt_results:
-            song.requester = ctx.author.name # Don't love setting this here but makes logic simpler and not require passing ctx around
-            songs_added += 1
-            total_duration += song.duration
-            if not first_song:
-                first_song = song
-            queue.append(song)
+        async with player.lock:
+            for song in yt_results:
+                song.requester = ctx.author.name # Don't love setting this here but makes logic simpler and not require passing ctx around
+                songs_added += 1
+                total_duration += song.duration
+                if not first_song:
+                    first_song = song
+                queue.append(song)
+            revalidate_prepared_source(ctx.guild.id)
 
         # SEND EMBED - TODO FIGURE OUT A WAY TO CLEANLY PASS THE TITLE
         await ctx.send(embed=create_playlist_embed("PLAYLIST TITLE PLACEHOLDER", songs_added, first_song, total_duration))
 
         # PLAY SONG IF NOTHING PLAYING
-        if not ctx.voice_client.is_playing() and queue:
-            song = queue.pop(0)
-            await play_song(ctx, song)
+        await advance(player)
 
     # SINGLE SONG
     else:
         song = yt_results[0]
         song.requester = ctx.author.name # Don't love setting this here but makes logic simpler and not require passing ctx around
 
-        # PLAY SONG / ADD TO QUEUE
-        if not ctx.voice_client.is_playing():
-            await play_song(ctx, song)
-        else:
+        # ADD TO QUEUE / PLAY SONG IF NOTHING PLAYING
+        async with player.lock:
             queue.append(song)
+            revalidate_prepared_source(ctx.guild.id)
+        await advance(player)
+        history.record(song, mbid=mb_results['mbid'] if mb_results else None, query=search)
 
         # SEND EMBED
-        await ctx.send(embed=create_song_embed(ctx, song, mb_results))
-    
-        # AUTOPLAY
-        if mb_results and is_autoplay_enabled(ctx.guild.id):
-            # GRAB RECS FROM LAST FM
-            success = await fetch_autoplay_recommendations(ctx, mb_results['mbid'], mb_results['artist'], mb_results['track'])
-            if success:
+        # STILL RUNNING (OR FINISHED SINCE WE LAST LOOKED) - finish_identification FILLS THE EMBED IN
+        identifying = identify_task is not None
+        embed = create_song_embed(ctx, song, mb_results, identifying)
+        message = await ctx.send(embed=embed)
+
+        # IDENTIFICATION-DEPENDENT WORK FINISHES AFTER /play RETURNS - stop_player CANCELS IT
+        if identify_task or mb_results:
+            player.identify_task = asyncio.create_task(
+                finish_identification(ctx, player, song, identify_task, mb_results, message, embed)
+            )
+
+
+def is_latest_identification(player):
+    # STILL THE GUILD'S PLAYER AND NO NEWER /play HAS STARTED IDENTIFYING SINCE
+    return players.get(player.guild_id) is player and player.identify_task is asyncio.current_task()
 
-                # CLEAR CURRENT AUTOPLAY QUEUE
-                autoplay_queue = get_autoplay_queue(ctx.guild.id)
-                autoplay_queue.clear()
-                
-                # LOAD TWO AUTOPLAY SONGS TO START - KEEPS BUFFER
-                for _ in range(2):
-                    await load_next_autoplay_song(ctx)
-                
-                print(f"Queued initial autoplay songs")
+
+async def finish_identification(ctx, player, song, identify_task, mb_results, message, embed):
+    try:
+        # IDENTIFICATION WAS STILL RUNNING WHEN THE EMBED WENT OUT - FILL IT IN NOW
+        if identify_task:
+            mb_results = matches_video(song, await identify_task)
+            set_identification(embed, mb_results)
+            await message.edit(embed=embed)
+
+        # PLAYER WAS STOPPED (OR REPLACED) WHILE WE WAITED - DON'T SEED A QUEUE NOBODY IS LISTENING TO
+        if not mb_results or players.get(ctx.guild.id) is not player:
+            return
+        song.track = mb_results['track']
+        song.artist = mb_results['artist']
+        get_history(ctx.guild.id).record(song, mbid=mb_results['mbid'])
+
+        # AUTOPLAY - ONLY THE LATEST /play SEEDS IT, AN OLDER IDENTIFICATION FINISHING LATE MUST NOT REPLACE A NEWER SEED
+        if is_autoplay_enabled(ctx.guild.id) and is_latest_identification(player):
+            # GRAB RECS FROM LAST FM
+            recommendations = await fetch_autoplay_recommendations(ctx, mb_results['mbid'], mb_results['artist'], mb_results['track'])
+            if recommendations and is_latest_identification(player):
+                store_autoplay_recommendations(ctx.guild.id, recommendations)
+                # FILLS THE AUTOPLAY QUEUE IN THE BACKGROUND
+                start_autoplay(player)
+    except Exception as e:
+        print(f"Error identifying {song}: {e}")
 
 
 @bot.command()
@@ -483,14 +984,14 @@ async def skip(ctx):
     autoplay_recs = get_autoplay_recommendations(ctx.guild.id)  # AUTOPLAY: Get recommendations
     
     # BUILD EMBED
-    embed = create_embed("Track Skipped", f"~~[{current.title}]({current.url})~~")
+    embed = create_embed("Track Skipped", f"~~{current.link()}~~")
     
     # SHOW NEXT IN QUEUE
     if queue:
         next_song = queue[0]
         embed.add_field(
             name="Up Next", 
-            value=f"[{next_song.title}]({next_song.url})",
+            value=next_song.link(),
             inline=False
         )
     # SHOW NEXT IN AUTOPLAY QUEUE - TODO THIS TECHNICALLY WILL SHOW THE NEXT SONG TWICE, HERE AND VIA CALLBACK
@@ -498,7 +999,7 @@ async def skip(ctx):
         next_song = autoplay_queue[0]
         embed.add_field(
             name="Up Next (Autoplay)", 
-            value=f"[{next_song.title}]({next_song.url})",
+            value=next_song.link(),
             inline=False
         )
     else:
@@ -525,13 +1026,12 @@ async def queue(ctx):
     
     # BUILD QUEUE
     queue_text = ""
-    total_duration = 0
 
     # DISPLAY CURRENTLY PLAYING SONG
     current = currently_playing.get(ctx.guild.id)
     if current:
         duration_str = f"{current.duration // 60}:{current.duration % 60:02d}"
-        queue_text += f"**Now Playing**\n[{current.title}]({current.url}) `[{duration_str}]`\n"
+        queue_text += f"**Now Playing**\n{current.link()} `[{duration_str}]`\n"
 
     
     # QUEUE
@@ -539,9 +1039,9 @@ async def queue(ctx):
         queue_text += "\n**__Queue__**\n"
     for i, song in enumerate(queue, 1):
         duration_str = f"{song.duration // 60}:{song.duration % 60:02d}"
-        queue_text += f"**{i}.** [{song.title}]({song.url}) `[{duration_str}]`\n"
-        total_duration += song.duration
+        queue_text += f"**{i}.** {song.link()} `[{duration_str}]`\n"
 
+    total_duration = queue.total_duration
     total_str = f"{total_duration // 60}:{total_duration % 60:02d}"
     
     # AUTOPLAY QUEUE
@@ -549,14 +1049,14 @@ async def queue(ctx):
         queue_text += "\n**__Autoplay Queue (Next 5)__**\n"
         
         # SONGS ALREADY RETRIEVED FROM YOUTUBE
-        for i, song in enumerate(autoplay_queue[:5], 1):
+        for i, song in enumerate(autoplay_queue.head(5), 1):
             duration_str = f"{song.duration // 60}:{song.duration % 60:02d}"
-            queue_text += f"**A{i}.** [{song.title}]({song.url}) `[{duration_str}]`\n"
+            queue_text += f"**A{i}.** {song.link()} `[{duration_str}]`\n"
         
         # UPCOMING RECOMMENDATIONS
         remaining_slots = 5 - len(autoplay_queue)
         if remaining_slots > 0 and autoplay_recs:
-            for i, rec in enumerate(autoplay_recs[:remaining_slots], len(autoplay_queue) + 1):
+            for i, rec in enumerate(islice(autoplay_recs, remaining_slots), len(autoplay_queue) + 1):
                 queue_text += f"**A{i}.** {rec['artist']} - {rec['title']} `[pending]`\n"
     
     # FOOTER
@@ -589,10 +1089,11 @@ async def shuffle(ctx):
         return
     
     # SHUFFLE QUEUE
-    random.shuffle(queue)
+    queue.shuffle()
+    revalidate_prepared_source(ctx.guild.id)
     
     # CREATE PREVIEW
-    preview = "\n".join([f"**{i+1}.** {song.title}" for i, song in enumerate(queue[:5])])
+    preview = "\n".join([f"**{i+1}.** {song.title}" for i, song in enumerate(queue.head(5))])
     if len(queue) > 5:
         preview += f"\n*...and {len(queue) - 5} more*"
     
@@ -613,6 +1114,7 @@ async def clear(ctx):
     # CLEAR QUEUE
     song_count = len(queue)
     queue.clear()
+    revalidate_prepared_source(ctx.guild.id)
     
     # SEND EMBED
     await ctx.send(embed=create_embed("Queue Cleared", f"Removed {song_count} song{'s' if song_count != 1 else ''} from the queue"))
@@ -637,10 +1139,11 @@ async def remove(ctx, position: int):
         return
     
     # REMOVE SONG
-    removed_song = queue.pop(position - 1)
+    removed_song = queue.remove_at(position - 1)
+    revalidate_prepared_source(ctx.guild.id)
     
     # SEND EMBED
-    await ctx.send(embed=create_embed("Song Removed", f"~~[{removed_song.title}]({removed_song.url})~~", discord.Color.blue(), f"{len(queue)} song{'s' if len(queue) != 1 else ''} remaining in queue"))
+    await ctx.send(embed=create_embed("Song Removed", f"~~{removed_song.link()}~~", discord.Color.blue(), f"{len(queue)} song{'s' if len(queue) != 1 else ''} remaining in queue"))
 
 
 @bot.command()
@@ -662,11 +1165,11 @@ async def bump(ctx, position: int):
         return
 
     # BUMP SONG
-    bumped_song = queue.pop(position - 1)
-    queue.insert(0, bumped_song)
+    bumped_song = queue.move_to_front(position - 1)
+    revalidate_prepared_source(ctx.guild.id)
     
     # SEND EMBED
-    await ctx.send(embed=create_embed("Song Bumped to Top", f"[{bumped_song.title}]({bumped_song.url})"))
+    await ctx.send(embed=create_embed("Song Bumped to Top", bumped_song.link()))
 
 
 @bot.command()
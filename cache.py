@@ -0,0 +1,173 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SQLiteCache:
+    """Disk-backed response cache with per-namespace TTLs, negative caching and LRU eviction"""
+
+    def __init__(self, path, max_entries=20000, ttls=None, default_ttl=86400, negative_ttl=21600, evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every  # Writes between eviction passes - the table may overshoot by this much
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value TEXT NOT NULL,
+                negative INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(namespace, params):
+        """Build a stable key from a namespace and its params, ignoring case and spacing"""
+        normalized = {
+            name: " ".join(str(value).lower().split())
+            for name, value in params.items()
+            if value is not None
+        }
+        return f"{namespace}:{json.dumps(normalized, sort_keys=True)}"
+
+    def get(self, namespace, params):
+        """Return (hit, value) - negative entries hit with their stored empty value"""
+        key = self.make_key(namespace, params)
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, negative, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is None or row[2] < now:
+                    self.misses += 1
+                    return False, None
+
+                # TOUCH FOR LRU
+                self._conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+
+            self.hits += 1
+            if row[1]:
+                self.negative_hits += 1
+            return True, json.loads(row[0])
+
+        except sqlite3.Error as e:
+            print(f"Cache read error: {e}")
+            self.misses += 1
+            return False, None
+
+    def set(self, namespace, params, value, negative=False):
+        """Store a value, using the negative TTL for empty results"""
+        key = self.make_key(namespace, params)
+        now = time.time()
+        ttl = self.negative_ttl if negative else self.ttls.get(namespace, self.default_ttl)
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, namespace, value, negative, expires_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, json.dumps(value), int(negative), now + ttl, now)
+                )
+                # EVICTION COUNTS THE WHOLE TABLE - AMORTIZED OVER evict_every WRITES
+                self._writes += 1
+                if self._writes % self.evict_every == 0:
+                    self._evict(now)
+                self._conn.commit()
+
+        except sqlite3.Error as e:
+            print(f"Cache write error: {e}")
+
+    def _evict(self, now):
+        # DROP EXPIRED ROWS FIRST, THEN THE LEAST RECENTLY USED OVER THE SIZE BUDGET
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if size > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used LIMIT ?)",
+                (size - self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """In-memory LRU cache with a TTL and a separate TTL for negative results"""
+
+    def __init__(self, max_entries=1000, ttl=86400, negative_ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._entries = OrderedDict()  # key -> (value, negative, expires_at)
+
+    def get(self, key):
+        """Return (hit, value) - negative entries hit with a value of None"""
+        entry = self._entries.get(key)
+        if entry is None or entry[2] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False, None
+
+        # TOUCH FOR LRU
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if entry[1]:
+            self.negative_hits += 1
+        return True, entry[0]
+
+    def set(self, key, value, negative=False):
+        ttl = self.negative_ttl if negative else self.ttl
+        self._entries[key] = (value, negative, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
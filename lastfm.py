@@ -1,20 +1,133 @@
-import requests
+import aiohttp
+import asyncio
 import os
 import random
 from dotenv import load_dotenv
+from cache import SQLiteCache
+from similarity import SimilarityGraph
+
+# HOW LONG EACH METHOD'S RESPONSES STAY FRESH IN THE CACHE
+CACHE_TTLS = {
+    "track.getsimilar": 7 * 86400,
+    "artist.getsimilar": 7 * 86400,
+    "artist.gettoptracks": 86400,
+}
+
+# WHERE EACH METHOD'S RESULTS LIVE IN THE RESPONSE - EMPTY RESULTS ARE NEGATIVE CACHED
+RESULT_PATHS = {
+    "track.getsimilar": ("similartracks", "track"),
+    "artist.getsimilar": ("similarartists", "artist"),
+    "artist.gettoptracks": ("toptracks", "track"),
+}
+
+# LAST.FM ERROR CODES THAT MEAN "NO SUCH ITEM" RATHER THAN A TEMPORARY FAILURE
+NOT_FOUND_ERRORS = {6, 7}
 
 class LastFMClient:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, timeout=None, max_connections=None, fanout_concurrency=None, hedged=None, hedge_delay=None, cache=None, graph=None):
         self.lastfm_api_key = api_key or os.getenv('LASTFM_API_KEY')
         self.lastfm_api_base = "http://ws.audioscrobbler.com/2.0/"
+        self.timeout = timeout or float(os.getenv('LASTFM_TIMEOUT', '5'))
+        self.max_connections = max_connections or int(os.getenv('LASTFM_MAX_CONNECTIONS', '10'))
+        self.fanout_concurrency = fanout_concurrency or int(os.getenv('LASTFM_FANOUT_CONCURRENCY', '5'))
+        self.hedged = hedged if hedged is not None else os.getenv('LASTFM_HEDGED', '0') == '1'
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(os.getenv('LASTFM_HEDGE_DELAY', '0.25'))
+        self._session = None
+
+        # PERSISTENT RESPONSE CACHE - SET LASTFM_CACHE_PATH TO AN EMPTY STRING TO DISABLE
+        cache_path = os.getenv('LASTFM_CACHE_PATH', 'logs/lastfm_cache.sqlite3')
+        if cache is None and cache_path:
+            cache = SQLiteCache(
+                cache_path,
+                max_entries=int(os.getenv('LASTFM_CACHE_MAX_ENTRIES', '20000')),
+                ttls=CACHE_TTLS,
+                negative_ttl=int(os.getenv('LASTFM_CACHE_NEGATIVE_TTL', '21600'))
+            )
+        self.cache = cache
+
+        # LOCAL SIMILARITY GRAPH GROWN FROM EVERY RESPONSE - SET LASTFM_GRAPH_PATH TO AN EMPTY STRING TO DISABLE
+        graph_path = os.getenv('LASTFM_GRAPH_PATH', 'logs/similarity_graph.sqlite3')
+        if graph is None and graph_path:
+            graph = SimilarityGraph(graph_path, min_neighbors=int(os.getenv('LASTFM_GRAPH_MIN_NEIGHBORS', '10')))
+        self.graph = graph
+
+    async def _get_session(self):
+        """Get the shared pooled session, creating it on first use"""
+        # SESSION MUST BE CREATED INSIDE THE RUNNING EVENT LOOP
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Close the shared session"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def cache_stats(self):
+        """Get hit/miss counters for the response cache"""
+        return self.cache.stats() if self.cache else None
+
+    async def _request(self, params, timeout=None):
+        """Make a single Last.fm API call and return the decoded JSON, using the cache when possible"""
+        method = params["method"]
+        cache_params = {k: v for k, v in params.items() if k not in ("method", "api_key", "format")}
+
+        if self.cache:
+            # SQLITE READS AND COMMITS STAY OFF THE EVENT LOOP
+            hit, data = await asyncio.to_thread(self.cache.get, method, cache_params)
+            if hit:
+                return data
+
+        session = await self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        async with session.get(self.lastfm_api_base, params=params, timeout=client_timeout) as response:
+            response.raise_for_status()
+            # LAST.FM SOMETIMES SERVES JSON WITH A TEXT/PLAIN CONTENT TYPE
+            data = await response.json(content_type=None)
+
+        if self.cache:
+            error = data.get("error")
+            # DON'T CACHE RATE LIMITS OR OUTAGES - ONLY REAL ANSWERS
+            if error is None or error in NOT_FOUND_ERRORS:
+                negative = error is not None or not self._has_results(method, data)
+                await asyncio.to_thread(self.cache.set, method, cache_params, self._strip_images(data), negative=negative)
+
+        return data
+
+    @staticmethod
+    def _has_results(method, data):
+        outer, inner = RESULT_PATHS.get(method, (None, None))
+        if outer is None:
+            return bool(data)
+        return bool((data.get(outer) or {}).get(inner))
+
+    @classmethod
+    def _strip_images(cls, data):
+        # IMAGE LISTS ARE MOST OF EACH RESPONSE AND THE BOT NEVER USES THEM
+        if isinstance(data, dict):
+            return {k: cls._strip_images(v) for k, v in data.items() if k != "image"}
+        if isinstance(data, list):
+            return [cls._strip_images(v) for v in data]
+        return data
     
-    def get_recommendations(self, mbid: str, artist: str, title: str, limit: int = 10) -> list[dict]:
+    async def get_recommendations(self, mbid: str, artist: str, title: str, limit: int = 10, hedged: bool = None) -> list[dict]:
         """Get track recommendations with automatic fallback"""
+        # Try 0: Local similarity graph - only cold seeds need the network
+        if self.graph and artist and title:
+            recs = await asyncio.to_thread(self.graph.recommend, artist, title, limit=limit)
+            if recs:
+                print(f"✓ Found {len(recs)} recommendations from local graph")
+                return recs
+
+        if self.hedged if hedged is None else hedged:
+            return await self._get_recommendations_hedged(mbid, artist, title, limit)
         
         # Try 1: MBID lookup
         if mbid:
             print(f"Trying MBID: {mbid}")
-            recs = self._get_similar_tracks(mbid=mbid, limit=limit)
+            recs = await self._get_similar_tracks(mbid=mbid, artist=artist, track=title, limit=limit)
             if recs:
                 print(f"✓ Found {len(recs)} recommendations via MBID")
                 return recs
@@ -22,7 +135,7 @@ class LastFMClient:
         
         # Try 2: Artist + Track name
         print(f"Trying: {artist} - {title}")
-        recs = self._get_similar_tracks(artist=artist, track=title, limit=limit)
+        recs = await self._get_similar_tracks(artist=artist, track=title, limit=limit)
         if recs:
             print(f"✓ Found {len(recs)} recommendations via track")
             return recs
@@ -30,15 +143,77 @@ class LastFMClient:
         
         # Try 3: Similar artists
         print(f"Trying artist: {artist}")
-        recs = self._get_similar_artists(artist, limit=limit)
+        recs = await self._get_similar_artists(artist, limit=limit)
         if recs:
             print(f"✓ Found {len(recs)} recommendations from similar artists")
             return recs
         
+        return await self._graph_artist_fallback(artist, limit)
+
+    async def _graph_artist_fallback(self, artist, limit):
+        # Try 4: Artist-level graph data - only after every network tier came back empty
+        if self.graph and artist:
+            recs = await asyncio.to_thread(self.graph.recommend_from_artists, artist, limit=limit)
+            if recs:
+                print(f"✓ Found {len(recs)} recommendations from the local artist graph")
+                return recs
+
         print("✗ No recommendations found")
         return []
     
-    def _get_similar_tracks(self, mbid=None, artist=None, track=None, limit=10):
+    async def _get_recommendations_hedged(self, mbid, artist, title, limit=10):
+        """Start the fallback tiers speculatively and keep the first success in priority order"""
+        tiers = []
+        if mbid:
+            tiers.append(("MBID", lambda: self._get_similar_tracks(mbid=mbid, artist=artist, track=title, limit=limit)))
+        tiers.append(("track", lambda: self._get_similar_tracks(artist=artist, track=title, limit=limit)))
+        tiers.append(("similar artists", lambda: self._get_similar_artists(artist, limit=limit)))
+
+        print(f"Trying {len(tiers)} tiers in parallel: {artist} - {title}")
+
+        # EACH TIER STARTS ONE HEDGE DELAY AFTER THE TIER BEFORE IT STARTED, OR AS SOON AS THAT TIER FAILS
+        tasks = []
+        started = [asyncio.Event() for _ in tiers]
+        for index, (_, fetch) in enumerate(tiers):
+            previous_started = started[index - 1] if index else None
+            tasks.append(asyncio.create_task(self._run_hedged_tier(tasks[:index], previous_started, started[index], fetch)))
+
+        try:
+            # AWAIT IN PRIORITY ORDER SO A LOWER TIER NEVER BEATS A HIGHER ONE THAT SUCCEEDS
+            for (name, _), task in zip(tiers, tasks):
+                recs = await task
+                if recs:
+                    print(f"✓ Found {len(recs)} recommendations via {name}")
+                    return recs
+                print(f"✗ {name} lookup failed")
+
+            return await self._graph_artist_fallback(artist, limit)
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_hedged_tier(self, earlier_tasks, previous_started, started, fetch):
+        """Run one hedged tier once the previous tier has failed or the hedge delay has passed since it started"""
+        try:
+            if earlier_tasks:
+                # THE DELAY COUNTS FROM THE PREVIOUS TIER'S START, SO TIERS STAGGER INSTEAD OF BURSTING TOGETHER
+                await previous_started.wait()
+                try:
+                    await asyncio.wait_for(asyncio.shield(earlier_tasks[-1]), self.hedge_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                # SKIP THE REQUEST ENTIRELY IF A HIGHER TIER ALREADY WON
+                if any(task.done() and task.result() for task in earlier_tasks):
+                    return []
+        finally:
+            # LATER TIERS NEVER WAIT FOREVER ON ONE THAT WAS SKIPPED
+            started.set()
+
+        return await fetch()
+
+    async def _get_similar_tracks(self, mbid=None, artist=None, track=None, limit=10):
         """Get similar tracks from Last.fm"""
         params = {
             "method": "track.getsimilar",
@@ -55,20 +230,28 @@ class LastFMClient:
             params["track"] = track
         
         try:
-            response = requests.get(self.lastfm_api_base, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = await self._request(params)
             
             tracks = data.get("similartracks", {}).get("track", [])
+
+            # GROW THE LOCAL GRAPH FROM THIS SEED - ONLY REAL ANSWERS, AN ERROR OR EMPTY LIST WOULD WIPE ITS EDGES
+            similar = [
+                (t["artist"]["name"], t["name"], float(t.get("match") or 0))
+                for t in tracks if t.get("name") and t.get("artist", {}).get("name")
+            ]
+            if self.graph and artist and track and "error" not in data and similar:
+                await asyncio.to_thread(self.graph.add_similar_tracks, artist, track, similar)
+
             return [{
                 "title": t.get("name"),
-                "artist": t.get("artist", {}).get("name")
+                "artist": t.get("artist", {}).get("name"),
+                "mbid": t.get("mbid") or None  # Last.fm sends "" when it has none
             } for t in tracks if t.get("name") and t.get("artist", {}).get("name")]
         
         except Exception:
             return []
     
-    def _get_similar_artists(self, artist, limit=10):
+    async def _get_similar_artists(self, artist, limit=10, early_return=True):
         """Get similar artists and randomly select from their top tracks"""
         # Get 4 similar artists
         params = {
@@ -79,25 +262,41 @@ class LastFMClient:
             "limit": 4,
             "autocorrect": 1
         }
+
+        # BOUND HOW MANY TOP TRACK REQUESTS ARE IN FLIGHT AT ONCE
+        semaphore = asyncio.Semaphore(self.fanout_concurrency)
+
+        async def fetch_top_tracks(artist_name):
+            async with semaphore:
+                tracks = await self._get_artist_top_tracks(artist_name, limit=20)
+            print(f"    {artist_name}: {len(tracks)} tracks")
+            return tracks
+
+        # START THE ORIGINAL ARTIST'S TOP TRACKS WHILE SIMILAR ARTISTS LOAD
+        tasks = [asyncio.create_task(fetch_top_tracks(artist))]
         
         try:
-            response = requests.get(self.lastfm_api_base, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = await self._request(params)
             
             similar_artists = data.get("similarartists", {}).get("artist", [])
+            similar_names = [a.get("name") for a in similar_artists if a.get("name")]
+
+            if self.graph and "error" not in data and similar_names:
+                await asyncio.to_thread(self.graph.add_similar_artists, artist, [
+                    (a["name"], float(a.get("match") or 0)) for a in similar_artists if a.get("name")
+                ])
             
-            # Add the original artist to the list
-            all_artists = [artist] + [a.get("name") for a in similar_artists if a.get("name")]
-            
-            print(f"  Fetching top tracks from {len(all_artists)} artists...")
+            print(f"  Fetching top tracks from {len(similar_names) + 1} artists...")
+            tasks.extend(asyncio.create_task(fetch_top_tracks(name)) for name in similar_names)
             
-            # Collect top tracks from all artists
+            # Collect top tracks as each artist responds
             all_tracks = []
-            for artist_name in all_artists:
-                tracks = self._get_artist_top_tracks(artist_name, limit=20)
-                all_tracks.extend(tracks)
-                print(f"    {artist_name}: {len(tracks)} tracks")
+            for next_result in asyncio.as_completed(tasks):
+                all_tracks.extend(await next_result)
+
+                # STOP WAITING ONCE THE POOL CAN FILL THE LIMIT
+                if early_return and len(all_tracks) >= limit:
+                    break
             
             print(f"  Total track pool: {len(all_tracks)} tracks")
             
@@ -111,8 +310,13 @@ class LastFMClient:
         except Exception as e:
             print(f"  Error in _get_similar_artists: {e}")
             return []
+
+        finally:
+            # CANCEL ANY REQUESTS STILL RUNNING AFTER AN EARLY RETURN
+            for task in tasks:
+                task.cancel()
     
-    def _get_artist_top_tracks(self, artist, limit=20):
+    async def _get_artist_top_tracks(self, artist, limit=20):
         """Get the top tracks for an artist"""
         params = {
             "method": "artist.gettoptracks",
@@ -124,29 +328,32 @@ class LastFMClient:
         }
         
         try:
-            response = requests.get(self.lastfm_api_base, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = await self._request(params)
             
             tracks = data.get("toptracks", {}).get("track", [])
-            return [{
+            top_tracks = [{
                 "title": t.get("name"),
-                "artist": t.get("artist", {}).get("name")
+                "artist": t.get("artist", {}).get("name"),
+                "mbid": t.get("mbid") or None  # Last.fm sends "" when it has none
             } for t in tracks if t.get("name") and t.get("artist", {}).get("name")]
+
+            if self.graph and "error" not in data and top_tracks:
+                await asyncio.to_thread(self.graph.add_top_tracks, artist, [(t["artist"], t["title"]) for t in top_tracks])
+
+            return top_tracks
         
         except Exception:
             return []
 
 
 # DEBUG
-if __name__ == "__main__":
-    load_dotenv()
+async def _debug():
     client = LastFMClient(os.getenv('LASTFM_API_KEY'))
     
     print("=" * 60)
     print("TEST 1: Try with MBID (should work)")
     print("=" * 60)
-    recs = client.get_recommendations(
+    recs = await client.get_recommendations(
         artist="Radiohead",
         title="Creep",
         mbid="6b9c2fb0-0f4a-4d6f-b5b3-e5f4f5e5c5a5",  # fake MBID, will fail
@@ -159,7 +366,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 60)
     print("TEST 2: Try with artist + track (should work)")
     print("=" * 60)
-    recs = client.get_recommendations(
+    recs = await client.get_recommendations(
         artist="Kendrick Lamar",
         title="HUMBLE.",
         mbid=None,
@@ -172,7 +379,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 60)
     print("TEST 3: Fallback to similar artists (obscure track)")
     print("=" * 60)
-    recs = client.get_recommendations(
+    recs = await client.get_recommendations(
         artist="Big K.R.I.T.",
         title="Definitely Not A Real Song Name 12345",
         mbid=None,
@@ -185,7 +392,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 60)
     print("TEST 4: Another artist fallback test")
     print("=" * 60)
-    recs = client.get_recommendations(
+    recs = await client.get_recommendations(
         artist="Anderson .Paak",
         title="Not A Real Song",
         mbid=None,
@@ -193,4 +400,12 @@ if __name__ == "__main__":
     )
     print(f"\nResults: {len(recs)} tracks")
     for i, rec in enumerate(recs, 1):
-        print(f"  {i}. {rec['artist']} - {rec['title']}")
\ No newline at end of file
+        print(f"  {i}. {rec['artist']} - {rec['title']}")
+    
+    print(f"\nCache: {client.cache_stats()}")
+    await client.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(_debug())
\ No newline at end of file
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rapidfuzz import fuzz, process, utils
+
+AUDIO_EXTENSIONS = {'.mp3', '.flac', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.wma', '.aiff', '.alac'}
+
+# FFPROBE TAG NAMES VARY BY CONTAINER (ID3, VORBIS COMMENTS, MP4 ATOMS) - LOWERCASED BEFORE LOOKUP
+MBID_TAGS = ('musicbrainz_trackid', 'musicbrainz track id')
+
+
+def probe(path):
+    """Tags and duration for one file - runs on a scanner thread"""
+    stat = os.stat(path)
+    metadata = {
+        'path': path,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'title': None,
+        'artist': None,
+        'album': None,
+        'mbid': None,
+        'duration': None,  # Stays None if ffprobe can't read it - kept out of search
+    }
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration:format_tags', '-of', 'json', path],
+            capture_output=True, timeout=30
+        )
+        info = json.loads(result.stdout or b'{}').get('format', {})
+    except (subprocess.SubprocessError, ValueError, OSError):
+        info = {}
+
+    tags = {key.lower(): value for key, value in info.get('tags', {}).items()}
+    if info.get('duration'):
+        metadata['duration'] = int(float(info['duration']))
+    metadata['title'] = tags.get('title')
+    metadata['artist'] = tags.get('artist') or tags.get('album_artist')
+    metadata['album'] = tags.get('album')
+    metadata['mbid'] = next((tags[tag] for tag in MBID_TAGS if tags.get(tag)), None)
+
+    # UNTAGGED FILES - FALL BACK TO "ARTIST - TITLE.ext" FILENAMES
+    if not metadata['title']:
+        name = os.path.splitext(os.path.basename(path))[0]
+        artist, sep, title = name.partition(' - ')
+        metadata['title'] = title if sep else name
+        metadata['artist'] = metadata['artist'] or (artist if sep else None)
+
+    return metadata
+
+
+class LocalLibrary:
+    """Incrementally scanned index of a local music directory with fuzzy search"""
+
+    def __init__(self, root, index_path, workers=None, threshold=85):
+        self.root = root
+        self.workers = workers or os.cpu_count()
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._scan_lock = asyncio.Lock()
+
+        # SEARCH STATE - REBUILT AFTER EVERY SCAN
+        self._tracks = []
+        self._choices = []
+
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                title TEXT,
+                artist TEXT,
+                album TEXT,
+                mbid TEXT,
+                duration INTEGER
+            )
+        """)
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, title, artist, album, mbid, duration FROM tracks WHERE duration IS NOT NULL"
+            ).fetchall()
+
+        tracks = [
+            {'path': path, 'title': title, 'artist': artist, 'album': album, 'mbid': mbid, 'duration': duration}
+            for path, title, artist, album, mbid, duration in rows
+        ]
+        # MATCH ON "ARTIST TITLE", PREPROCESSED ONCE HERE INSTEAD OF ON EVERY SEARCH
+        choices = [utils.default_process(f"{track['artist'] or ''} {track['title']}") for track in tracks]
+        # ONE ASSIGNMENT - A SEARCH RUNNING DURING A RESCAN NEVER SEES NEW CHOICES WITH OLD TRACKS
+        self._tracks, self._choices = tracks, choices
+
+    def _walk(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                    yield os.path.join(directory, name)
+
+    def scan(self):
+        """Probe new and modified files, drop deleted ones - returns (updated, removed)"""
+        with self._lock:
+            known = {path: (mtime, size) for path, mtime, size in self._conn.execute("SELECT path, mtime, size FROM tracks")}
+
+        # ONLY FILES WHOSE MTIME OR SIZE CHANGED GET PROBED AGAIN
+        changed = []
+        seen = set()
+        for path in self._walk():
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append(path)
+        removed = [(path,) for path in known if path not in seen]
+
+        results = []
+        if changed:
+            # FFPROBE PER FILE - THE WORK HAPPENS IN THE SUBPROCESS, SO THREADS PARALLELIZE IT WITHOUT FORKING THE BOT
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for path, future in [(path, executor.submit(probe, path)) for path in changed]:
+                    try:
+                        results.append(future.result())
+                    except OSError as e:
+                        print(f"Error scanning {path}: {e}")
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tracks VALUES (:path, :mtime, :size, :title, :artist, :album, :mbid, :duration)",
+                results
+            )
+            self._conn.executemany("DELETE FROM tracks WHERE path = ?", removed)
+            self._conn.commit()
+
+        self._load()
+        return len(results), len(removed)
+
+    async def scan_async(self):
+        # OFF THE EVENT LOOP - CONCURRENT CALLS SHARE ONE SCAN AT A TIME
+        async with self._scan_lock:
+            start = time.time()
+            updated, removed = await asyncio.to_thread(self.scan)
+            print(f"Scanned local library: {len(self._tracks)} tracks, {updated} updated, {removed} removed ({time.time() - start:.1f}s)")
+
+    def search(self, query, threshold=None):
+        """Best matching track dict for a free-text query, or None"""
+        tracks, choices = self._tracks, self._choices
+        if not choices:
+            return None
+        match = process.extractOne(
+            utils.default_process(query),
+            choices,
+            scorer=fuzz.token_sort_ratio,
+            processor=None,
+            score_cutoff=threshold if threshold is not None else self.threshold
+        )
+        if not match:
+            return None
+        return tracks[match[2]]
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == 'scan':
+        library = LocalLibrary(sys.argv[2], sys.argv[3])
+        start = time.perf_counter()
+        updated, removed = library.scan()
+        print(f"{len(library)} tracks, {updated} updated, {removed} removed ({time.perf_counter() - start:.2f} s)")
+
+    elif len(sys.argv) == 5 and sys.argv[1] == 'search':
+        library = LocalLibrary(sys.argv[2], sys.argv[3])
+        start = time.perf_counter()
+        result = library.search(sys.argv[4])
+        print(f"{(time.perf_counter() - start) * 1000:.3f} ms")
+        print(f"  {result}")
+
+    else:
+        print("usage: python library.py scan <music dir> <index path>")
+        print("       python library.py search <music dir> <index path> <query>")
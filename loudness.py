@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# SAME TARGETS AS THE SINGLE-PASS FILTER IN play_song
+TARGET_I = -16.0
+TARGET_TP = -1.5
+TARGET_LRA = 11.0
+MEASURED_FIELDS = ('input_i', 'input_tp', 'input_lra', 'input_thresh')
+
+
+class LoudnessStore:
+    """Measured loudnorm stats per track, so each track is only analyzed once"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS loudness (
+                track_key TEXT PRIMARY KEY,
+                input_i REAL NOT NULL,
+                input_tp REAL NOT NULL,
+                input_lra REAL NOT NULL,
+                input_thresh REAL NOT NULL,
+                measured_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, track_key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT input_i, input_tp, input_lra, input_thresh FROM loudness WHERE track_key = ?", (track_key,)
+            ).fetchone()
+        return dict(zip(MEASURED_FIELDS, row)) if row else None
+
+    def put(self, track_key, stats):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?, ?)",
+                (track_key, *(stats[field] for field in MEASURED_FIELDS), time.time())
+            )
+            self._conn.commit()
+
+
+def gain_filter(stats):
+    """Cheap linear gain to the loudnorm target, capped so true peak stays under the ceiling"""
+    gain = min(TARGET_I - stats['input_i'], TARGET_TP - stats['input_tp'])
+    return f"volume={gain:.2f}dB"
+
+
+def parse_loudnorm_output(stderr):
+    # LOUDNORM PRINTS ITS JSON SUMMARY AS THE LAST {...} BLOCK ON STDERR
+    start, end = stderr.rfind('{'), stderr.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        data = json.loads(stderr[start:end + 1])
+        stats = {field: float(data[field]) for field in MEASURED_FIELDS}
+    except (ValueError, KeyError):
+        return None
+
+    # SILENCE MEASURES AS -inf - NOTHING USEFUL TO STORE
+    if any(abs(value) == float('inf') for value in stats.values()):
+        return None
+    return stats
+
+
+async def analyze(url, before_options=None, timeout=300):
+    """First pass of two-pass loudnorm - measure the whole track without playing it"""
+    args = ['ffmpeg', '-hide_banner', '-nostats']
+    if before_options:
+        args += before_options.split()
+    args += [
+        '-i', url, '-vn',
+        '-af', f'loudnorm=I={TARGET_I}:TP={TARGET_TP}:LRA={TARGET_LRA}:print_format=json',
+        '-f', 'null', '-',
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        process.kill()
+        await process.wait()
+        raise
+    return parse_loudnorm_output(stderr.decode('utf-8', errors='replace'))
@@ -0,0 +1,253 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from rapidfuzz import utils
+
+
+# MBDUMP TABLES ARE POSTGRES COPY FORMAT - TAB SEPARATED, BACKSLASH ESCAPED, \N FOR NULL
+COPY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r'}
+ESCAPE_RE = re.compile(r'\\(.)')
+
+
+def _unescape(value):
+    if value == '\\N':
+        return None
+    if '\\' not in value:
+        return value
+    return ESCAPE_RE.sub(lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _read_table(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield [_unescape(value) for value in line.rstrip('\n').split('\t')]
+
+
+def trigrams(text):
+    # PER-WORD TRIGRAMS SO WORD ORDER DOESN'T MATTER ("track artist" == "artist track")
+    grams = set()
+    for word in utils.default_process(text).split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _write_run(path, postings):
+    # ONE SORTED RUN - [gram length][gram][id count][ids] PER TRIGRAM, IN GRAM ORDER
+    with open(path, 'wb') as f:
+        for gram in sorted(postings):
+            encoded = gram.encode('utf-8')
+            ids = postings[gram]
+            f.write(struct.pack('<HI', len(encoded), len(ids)))
+            f.write(encoded)
+            ids.tofile(f)
+
+
+def _read_run(path, run):
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(6)
+            if not header:
+                return
+            length, count = struct.unpack('<HI', header)
+            gram = f.read(length).decode('utf-8')
+            ids = array('I')
+            ids.fromfile(f, count)
+            yield gram, run, ids
+
+
+def build_index(dump_dir, out_dir, run_size=20_000_000):
+    """Build an index from mbdump `artist_credit` and `recording` tables (full or filtered)"""
+    os.makedirs(out_dir, exist_ok=True)
+
+    # ARTIST_CREDIT: id, name, ...
+    credits = {row[0]: row[1] for row in _read_table(os.path.join(dump_dir, 'artist_credit'))}
+
+    # RECORDING: id, gid, name, artist_credit, ...
+    # POSTINGS ARE FLUSHED TO SORTED RUNS EVERY run_size IDS SO A FULL DUMP NEVER SITS IN MEMORY
+    offsets = array('Q', [0])
+    postings = defaultdict(lambda: array('I'))
+    pending = 0
+    runs = []
+    with open(os.path.join(out_dir, 'records.bin'), 'wb') as records:
+        for row in _read_table(os.path.join(dump_dir, 'recording')):
+            mbid, title, artist = row[1], row[2], credits.get(row[3])
+            if not (mbid and title and artist):
+                continue
+
+            # RECORDS ARE TAB SEPARATED LINES - KEEP EMBEDDED TABS/NEWLINES OUT
+            artist, title = ' '.join(artist.split()), ' '.join(title.split())
+            record_id = len(offsets) - 1
+            line = f"{mbid}\t{artist}\t{title}\n".encode('utf-8')
+            records.write(line)
+            offsets.append(offsets[-1] + len(line))
+
+            for gram in trigrams(f"{artist} {title}"):
+                postings[gram].append(record_id)
+                pending += 1
+
+            if pending >= run_size:
+                runs.append(os.path.join(out_dir, f'run{len(runs)}.tmp'))
+                _write_run(runs[-1], postings)
+                postings.clear()
+                pending = 0
+
+    if postings:
+        runs.append(os.path.join(out_dir, f'run{len(runs)}.tmp'))
+        _write_run(runs[-1], postings)
+        postings.clear()
+
+    # MERGE RUNS - IDS ONLY GROW FROM RUN TO RUN, SO APPENDING IN RUN ORDER KEEPS EVERY LIST SORTED
+    lexicon = {}
+    position = 0
+    with open(os.path.join(out_dir, 'postings.bin'), 'wb') as f:
+        merged = heapq.merge(*(_read_run(path, run) for run, path in enumerate(runs)), key=lambda item: (item[0], item[1]))
+        for gram, _, ids in merged:
+            ids.tofile(f)
+            if gram in lexicon:
+                lexicon[gram][1] += len(ids)
+            else:
+                lexicon[gram] = [position, len(ids)]
+            position += len(ids)
+
+    for path in runs:
+        os.remove(path)
+
+    with open(os.path.join(out_dir, 'offsets.bin'), 'wb') as f:
+        offsets.tofile(f)
+
+    with open(os.path.join(out_dir, 'lexicon.json'), 'w', encoding='utf-8') as f:
+        json.dump(lexicon, f)
+
+    print(f"Indexed {len(offsets) - 1} recordings, {len(lexicon)} trigrams")
+    return len(offsets) - 1
+
+
+class MBIndex:
+    """Memory-mapped recording name table with a trigram inverted index"""
+
+    def __init__(self, path, candidate_cap=50000):
+        self.path = path
+        self.candidate_cap = candidate_cap  # Trigrams with longer postings only rescore, never add candidates
+
+        with open(os.path.join(path, 'lexicon.json'), encoding='utf-8') as f:
+            self.lexicon = json.load(f)
+
+        self._files = []
+        self._maps = []
+        self._records = self._map('records.bin')
+        offsets = self._map('offsets.bin')
+        postings = self._map('postings.bin')
+        self._offsets = memoryview(offsets).cast('Q') if offsets else ()
+        self._postings = memoryview(postings).cast('I') if postings else ()
+
+    def _map(self, name):
+        f = open(os.path.join(self.path, name), 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def __len__(self):
+        return max(len(self._offsets) - 1, 0)
+
+    def _record(self, record_id):
+        line = self._records[self._offsets[record_id]:self._offsets[record_id + 1]]
+        mbid, artist, title = line.decode('utf-8').rstrip('\n').split('\t')
+        return {'artist': artist, 'track': title, 'mbid': mbid}
+
+    def _contains(self, start, count, record_id):
+        # POSTINGS LISTS ARE SORTED - BINARY SEARCH INSTEAD OF READING A HUGE LIST
+        i = bisect_left(self._postings, record_id, start, start + count)
+        return i < start + count and self._postings[i] == record_id
+
+    def search(self, query, limit=25):
+        """Get up to `limit` candidate recordings with the highest IDF-weighted trigram overlap"""
+        entries = sorted(
+            (entry for entry in map(self.lexicon.get, trigrams(query)) if entry),
+            key=lambda entry: entry[1]
+        )
+        if not entries:
+            return []
+
+        # RARE TRIGRAMS (E.G. THE ARTIST NAME) COUNT FOR MORE THAN ONES SHARED BY HALF THE DUMP
+        total = len(self) or 1
+        scores = defaultdict(float)
+        for start, count in entries:
+            weight = math.log(1 + total / count)
+
+            # SHORT LISTS ADD CANDIDATES, LONG ONES ONLY ADD TO CANDIDATES ALREADY FOUND
+            if count <= self.candidate_cap:
+                for record_id in self._postings[start:start + count]:
+                    scores[record_id] += weight
+            elif scores:
+                for record_id in list(scores):
+                    if self._contains(start, count, record_id):
+                        scores[record_id] += weight
+            else:
+                # EVERY TRIGRAM IS COMMON ("creep") - SEED FROM THE RAREST ONE, CAPPED
+                for record_id in self._postings[start:start + self.candidate_cap]:
+                    scores[record_id] += weight
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [self._record(record_id) for record_id, _ in best]
+
+    def close(self):
+        # VIEWS MUST BE RELEASED BEFORE THEIR MMAPS CAN CLOSE
+        for view in (self._offsets, self._postings):
+            if isinstance(view, memoryview):
+                view.release()
+        self._offsets = self._postings = ()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+
+
+# DEBUG / CLI
+# python mb_index.py build <mbdump dir> <index dir>
+# python mb_index.py search <index dir> "artist track"
+# python mb_index.py  (builds and searches a tiny fixture dump)
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == 'build':
+        build_index(sys.argv[2], sys.argv[3])
+
+    elif len(sys.argv) == 4 and sys.argv[1] == 'search':
+        index = MBIndex(sys.argv[2])
+        start = time.perf_counter()
+        results = index.search(sys.argv[3], limit=5)
+        print(f"{(time.perf_counter() - start) * 1000:.3f} ms")
+        for result in results:
+            print(f"  {result['artist']} - {result['track']} ({result['mbid']})")
+
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            dump_dir = os.path.join(tmp, 'mbdump')
+            os.makedirs(dump_dir)
+            with open(os.path.join(dump_dir, 'artist_credit'), 'w', encoding='utf-8') as f:
+                f.write("1\tRadiohead\t1\n2\tKendrick Lamar\t1\n3\tSimon & Garfunkel\t1\n")
+            with open(os.path.join(dump_dir, 'recording'), 'w', encoding='utf-8') as f:
+                f.write("1\t8b8a38a9-a290-4560-84f6-3d4466e8d791\tCreep\t1\t238\n")
+                f.write("2\t4a3e5f5e-7f1c-4cc3-9a5b-0a3b7e0bb3c1\tKarma Police\t1\t264\n")
+                f.write("3\t9d2d3b7b-4f4a-4b2f-9e57-2a9e3e6b2c10\tHUMBLE.\t2\t177\n")
+                f.write("4\tc1c8b3a1-2f2e-4f8e-8b2e-1d0c1a7f9e21\tThe Sound of Silence\t3\t\\N\n")
+
+            build_index(dump_dir, os.path.join(tmp, 'index'))
+            index = MBIndex(os.path.join(tmp, 'index'))
+            for query in ["radiohead creep", "humble kendrick lamar", "sound of silence simon and garfunkel"]:
+                start = time.perf_counter()
+                results = index.search(query, limit=3)
+                print(f'"{query}" -> {results[0] if results else None} ({(time.perf_counter() - start) * 1000:.3f} ms)')
+            index.close()
@@ -1,11 +1,51 @@
 import musicbrainzngs
 from musicbrainzngs import NetworkError, WebServiceError
+import aiohttp
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from fuzzywuzzy import fuzz
+from rapidfuzz import fuzz, process, utils
 import time
 import os
 import re
+from cache import TTLCache
+from mb_index import MBIndex
+
+# COMPILED ONCE - _clean_text RUNS FOR EVERY CANDIDATE
+PUNCTUATION_RE = re.compile(r'[.,!?\'"()[\]{}]')
+WHITESPACE_RE = re.compile(r'\s+')
+
+MUSICBRAINZ_API_BASE = "https://musicbrainz.org/ws/2/"
+
+
+class TokenBucket:
+    """Async token bucket - waiters are served in FIFO order"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.waiting = 0  # queue depth
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            # ASYNCIO LOCKS ARE FIFO SO REQUESTS GO OUT IN ARRIVAL ORDER
+            async with self._lock:
+                while True:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
 
 
 class MBClient:
@@ -18,26 +58,221 @@ class MBClient:
         musicbrainzngs.set_rate_limit(2.0)
         self.executor = ThreadPoolExecutor(max_workers=3)
 
+        # ASYNCIO-NATIVE SEARCH - SET MUSICBRAINZ_NATIVE=0 TO USE THE MUSICBRAINZNGS THREAD POOL
+        self.native = os.getenv('MUSICBRAINZ_NATIVE', '1') == '1'
+
+        # ONE RECORDING SEARCH OVER THE RAW QUERY FIRST - SET MUSICBRAINZ_SINGLE_QUERY=0 FOR TWO-STEP ONLY
+        self.single_query = os.getenv('MUSICBRAINZ_SINGLE_QUERY', '1') == '1'
+        self.user_agent = f"{app}/{version} ( {contact} )"
+        self.timeout = float(os.getenv('MUSICBRAINZ_TIMEOUT', '10'))
+        self._session = None
 
-    async def song_search_async(self, query_string, score_threshold=75, limit=3, max_retries=3):
-        # ASYNC WRAPPER FOR SEARCH TO RUN BLOCKING CODE IN A THREAD
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self.song_search,
-            query_string,
-            score_threshold,
-            limit,
-            max_retries
+        # ONE LIMITER SHARED BY ARTIST AND RECORDING SEARCHES - DEFAULT ONE REQUEST EVERY 2 SECONDS
+        self.rate_limiter = TokenBucket(
+            rate=1 / float(os.getenv('MUSICBRAINZ_RATE_INTERVAL', '2.0')),
+            capacity=int(os.getenv('MUSICBRAINZ_RATE_BURST', '1'))
         )
 
+        # RESOLVED RESULTS (INCLUDING "NO MATCH") AND SEARCHES CURRENTLY RUNNING
+        self.results = TTLCache(
+            max_entries=int(os.getenv('MUSICBRAINZ_CACHE_SIZE', '2000')),
+            ttl=int(os.getenv('MUSICBRAINZ_CACHE_TTL', '604800')),
+            negative_ttl=int(os.getenv('MUSICBRAINZ_NEGATIVE_TTL', '3600'))
+        )
+        self.in_flight = {}
+
+        # OPTIONAL LOCAL INDEX BUILT FROM A MUSICBRAINZ DUMP (SEE mb_index.py)
+        self.index = None
+        index_path = os.getenv('MUSICBRAINZ_INDEX_PATH')
+        if index_path:
+            try:
+                self.index = MBIndex(index_path)
+                print(f"Loaded local MusicBrainz index ({len(self.index)} recordings)")
+            except OSError as e:
+                print(f"Failed to load local MusicBrainz index: {e}")
+
+
+    async def song_search_async(self, query_string, score_threshold=75, limit=25, max_retries=3):
+        # CACHED - ZERO MUSICBRAINZ CALLS
+        key = self._clean_text(query_string)
+        hit, result = self.results.get(key)
+        if hit:
+            print(f'MusicBrainz cache hit for "{query_string}"')
+            return result
+
+        # LOCAL INDEX - NO NETWORK AT ALL
+        if self.index:
+            candidates = await asyncio.to_thread(self.index.search, query_string, limit)
+            result = self._best_match(query_string, candidates, score_threshold)
+            if result:
+                print(f"Local match found! {result['artist']} - {result['track']} (MBID: {result['mbid']})")
+                return result
+
+        # COALESCE IDENTICAL QUERIES INTO ONE UPSTREAM SEARCH
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._search_and_cache(key, query_string, score_threshold, limit, max_retries))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            print(f'Joining in-flight MusicBrainz search for "{query_string}"')
+
+        # SHIELD SO ONE CANCELLED CALLER DOESN'T CANCEL THE SEARCH FOR EVERYONE ELSE
+        return await asyncio.shield(task)
+
+    async def _search_and_cache(self, key, query_string, score_threshold, limit, max_retries):
+        if self.native:
+            result, completed = await self._song_search_native(query_string, score_threshold, limit, max_retries)
+        else:
+            # ASYNC WRAPPER FOR SEARCH TO RUN BLOCKING CODE IN A THREAD
+            loop = asyncio.get_event_loop()
+            result, completed = await loop.run_in_executor(
+                self.executor,
+                self._song_search,
+                query_string,
+                score_threshold,
+                limit,
+                max_retries
+            )
+
+        # ONLY CACHE ANSWERS - ERRORS SHOULD BE RETRIED NEXT TIME
+        if completed:
+            self.results.set(key, result, negative=result is None)
+        return result
+
     
-    def song_search(self, query_string, score_threshold=75, limit=3, max_retries=3):
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={"User-Agent": self.user_agent, "Accept": "application/json"})
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self):
+        return {
+            "queue_depth": self.rate_limiter.waiting,
+            "in_flight": len(self.in_flight),
+            "cache": self.results.stats(),
+        }
+
+    async def _search(self, entity, query, limit):
+        # EVERY REQUEST WAITS ON THE SHARED RATE LIMITER - NOT ON A FREE THREAD
+        if self.rate_limiter.waiting:
+            print(f"MusicBrainz queue depth: {self.rate_limiter.waiting}")
+        await self.rate_limiter.acquire()
+
+        session = await self._get_session()
+        params = {"query": query, "limit": limit, "fmt": "json"}
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with session.get(f"{MUSICBRAINZ_API_BASE}{entity}/", params=params, timeout=timeout) as response:
+            # 503 IS MUSICBRAINZ SAYING SLOW DOWN - RETRYABLE LIKE A NETWORK ERROR
+            if response.status == 503:
+                raise aiohttp.ClientResponseError(response.request_info, response.history, status=503, message="Rate limited")
+            response.raise_for_status()
+            return await response.json()
+
+    async def _song_search_native(self, query_string, score_threshold=75, limit=25, max_retries=3):
+        # SAME FLOW AS _song_search BUT AWAITS THE RATE LIMITER AND BACKOFF INSTEAD OF HOLDING A THREAD
+        print(f'Searching MusicBrainz for "{query_string}"...')
+        artist = None
+        single_query_done = not self.single_query
+        for attempt in range(max_retries):
+            try:
+                # SINGLE QUERY - SCORE ARTIST CREDIT AND TITLE TOGETHER LOCALLY
+                if not single_query_done:
+                    recording_list = (await self._search("recording", query_string, limit)).get('recordings', [])
+                    candidates = [
+                        {'artist': self._artist_credit(recording), 'track': recording.get('title', 'Unknown'), 'mbid': recording.get('id')}
+                        for recording in recording_list
+                    ]
+                    matched_result = self._best_match(query_string, candidates, score_threshold)
+                    single_query_done = True
+
+                    if matched_result:
+                        print(f"Match found! {matched_result['artist']} - {matched_result['track']} (MBID: {matched_result['mbid']})")
+                        return matched_result, True
+                    print('No single-query match - falling back to artist search')
+
+                # SEARCH FOR ARTIST
+                if not artist:
+                    artists = (await self._search("artist", query_string, 1)).get('artists', [])
+                    if not artists:
+                        print('No artist found via MusicBrainz')
+                        return None, True
+                    artist = artists[0]['name']
+                    print(f'Artist found! "{artist}"')
+
+                # SEARCH FOR TOP RECORDINGS FOR FOUND ARTIST
+                recording_list = (await self._search("recording", f'{query_string} AND artist:"{artist}"', limit)).get('recordings', [])
+
+                # PARSE RECORDINGS DATA
+                candidates = []
+                for recording in recording_list:
+                    title = recording.get('title', 'Unknown')
+                    mbid = recording.get('id')
+                    candidates.append({'artist': artist, 'track': title, 'mbid': mbid})
+
+                # SCORE RESULTS - RETURN HIGHEST ABOVE THRESHOLD
+                matched_result = self._best_match(query_string, candidates, score_threshold)
+
+                if matched_result:
+                    print(f"Match found! {matched_result['artist']} - {matched_result['track']} (MBID: {matched_result['mbid']})")
+                else:
+                    print('No matches found via MusicBrainz')
+
+                return matched_result, True
+
+            # NETWORK ERROR HANDLING - MUSICBRAINZ IS TEMPERAMENTAL
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = e
+            except aiohttp.ClientResponseError as e:
+                if e.status != 503:
+                    print(f"MusicBrainz API error: {e}")
+                    return None, False
+                error = e
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                return None, False
+
+            print(f"Network error on attempt {attempt + 1}/{max_retries}: {error}")
+            if attempt < max_retries - 1:
+                wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
+                print(f"Retrying in {wait_time} seconds...")
+                await asyncio.sleep(wait_time)
+            else:
+                print("Max retries reached")
+
+        return None, False
+
+    def song_search(self, query_string, score_threshold=75, limit=25, max_retries=3):
+        return self._song_search(query_string, score_threshold, limit, max_retries)[0]
+
+    def _song_search(self, query_string, score_threshold=75, limit=25, max_retries=3):
+        # RETURNS (RESULT, COMPLETED) - COMPLETED IS FALSE WHEN THE SEARCH ERRORED OUT
         print(f'Searching MusicBrainz for "{query_string}"...')
         artist = None
         matched_result = None
+        single_query_done = not self.single_query
         for attempt in range(max_retries):
             try:
+                # SINGLE QUERY - SAME SHORT-CIRCUIT AS THE NATIVE PATH
+                if not single_query_done:
+                    recording_list = musicbrainzngs.search_recordings(query_string, limit)['recording-list']
+                    candidates = [
+                        {'artist': recording.get('artist-credit-phrase', 'Unknown'), 'track': recording.get('title', 'Unknown'), 'mbid': recording.get('id')}
+                        for recording in recording_list
+                    ]
+                    matched_result = self._best_match(query_string, candidates, score_threshold)
+                    single_query_done = True
+
+                    if matched_result:
+                        print(f"Match found! {matched_result['artist']} - {matched_result['track']} (MBID: {matched_result['mbid']})")
+                        return matched_result, True
+                    print('No single-query match - falling back to artist search')
+
                 # SEARCH FOR ARTIST
                 if not artist:
                     artist = musicbrainzngs.search_artists(query_string, 1)['artist-list'][0]['name']
@@ -47,32 +282,21 @@ class MBClient:
                 recording_list = musicbrainzngs.search_recordings(f'{query_string} AND artist:"{artist}"', limit)['recording-list']
 
                 # PARSE RECORDINGS DATA
-                top_tracks = []
+                candidates = []
                 for recording in recording_list:
                     title = recording.get('title', 'Unknown')
                     mbid = recording.get('id')
-                    top_tracks.append({'title': title, 'mbid': mbid})
+                    candidates.append({'artist': artist, 'track': title, 'mbid': mbid})
                 
                 # SCORE RESULTS - RETURN HIGHEST ABOVE THRESHOLD
-                score = score_threshold
-                for track_info in top_tracks:
-                    track = track_info['title']
-                    mb_match_string = f'{artist} - {track}'
-                    track_score = fuzz.token_sort_ratio(self._clean_text(query_string), self._clean_text(mb_match_string))
-                    if track_score > score:
-                        score = track_score
-                        matched_result = {
-                            'artist': artist,
-                            'track': track,
-                            'mbid': track_info['mbid']
-                        }
+                matched_result = self._best_match(query_string, candidates, score_threshold)
 
                 if matched_result:
                     print(f"Match found! {matched_result['artist']} - {matched_result['track']} (MBID: {matched_result['mbid']})")
                 else:
                     print('No matches found via MusicBrainz')
 
-                return matched_result
+                return matched_result, True
             
             # NETWORK ERROR HANDLING - MUSICBRAINZ IS TEMPERAMENTAL
             except NetworkError as e:
@@ -83,23 +307,45 @@ class MBClient:
                     time.sleep(wait_time)
                 else:
                     print("Max retries reached")
-                    return None
+                    return None, False
                     
             except WebServiceError as e:
                 print(f"MusicBrainz API error: {e}")
-                return None
+                return None, False
                 
             except Exception as e:
                 print(f"Unexpected error: {e}")
-                return None
+                return None, False
         
-        return None
+        return None, False
     
+    def _artist_credit(self, recording):
+        # "Artist A feat. Artist B" FROM THE JSON CREDIT LIST
+        credits = recording.get('artist-credit', [])
+        return ''.join(f"{c.get('name', '')}{c.get('joinphrase', '')}" for c in credits) or 'Unknown'
+
+    def _best_match(self, query_string, candidates, score_threshold=75):
+        # PREPROCESS EVERY CANDIDATE ONCE, THEN SCORE THE WHOLE BATCH IN RAPIDFUZZ
+        if not candidates:
+            return None
+        query = self._preprocess(query_string)
+        choices = [self._preprocess(f"{c['artist']} - {c['track']}") for c in candidates]
+        best = process.extractOne(query, choices, scorer=fuzz.token_sort_ratio, processor=None)
+
+        # MUST BEAT THE THRESHOLD, NOT JUST MEET IT - ROUNDED LIKE FUZZYWUZZY'S INTEGER SCORES
+        if best and round(best[1]) > score_threshold:
+            return candidates[best[2]]
+        return None
+
+    def _preprocess(self, text):
+        # SAME NORMALIZATION FUZZYWUZZY APPLIED INSIDE EVERY COMPARISON
+        return utils.default_process(self._clean_text(text))
+
     def _clean_text(self, text):
         text = text.lower()
-        text = re.sub(r'[.,!?\'"()[\]{}]', '', text) # Remove common punctuation
+        text = PUNCTUATION_RE.sub('', text) # Remove common punctuation
         text = text.replace('&', 'and') # Swap ampersands
-        text = re.sub(r'\s+', ' ', text) # Remove multiple spaces
+        text = WHITESPACE_RE.sub(' ', text) # Remove multiple spaces
         text = text.strip()
         return text
 
@@ -0,0 +1,181 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from similarity import normalize, track_key
+
+
+class SongQueue:
+    """Deque of songs with O(1) pops at both ends and running duration totals"""
+
+    def __init__(self, songs=()):
+        # PREFIX SUMS AGAINST A MOVING ORIGIN - TOTALS AND START TIMES ARE ONE SUBTRACTION, NOT A SUM
+        self._songs = deque()
+        self._ends = deque()  # Absolute end offset of each song
+        self._base = 0  # Absolute start offset of the head song
+        self.extend(songs)
+
+    @staticmethod
+    def _duration(song):
+        return song.duration or 0
+
+    def append(self, song):
+        end = self._ends[-1] if self._ends else self._base
+        self._songs.append(song)
+        self._ends.append(end + self._duration(song))
+
+    def extend(self, songs):
+        for song in songs:
+            self.append(song)
+
+    def appendleft(self, song):
+        # NEW HEAD STARTS EARLIER - EVERYTHING BEHIND IT SHIFTS WITHOUT BEING TOUCHED
+        self._songs.appendleft(song)
+        self._ends.appendleft(self._base)
+        self._base -= self._duration(song)
+
+    def popleft(self):
+        song = self._songs.popleft()
+        self._base = self._ends.popleft()
+        return song
+
+    def pop(self):
+        self._ends.pop()
+        return self._songs.pop()
+
+    def remove_at(self, index):
+        """Remove and return the song at a 0-based position"""
+        song = self._songs[index]
+        del self._songs[index]
+        self._rebuild()
+        return song
+
+    def move_to_front(self, index):
+        song = self.remove_at(index)
+        self.appendleft(song)
+        return song
+
+    def shuffle(self):
+        songs = list(self._songs)
+        random.shuffle(songs)
+        self.clear()
+        self.extend(songs)
+
+    def clear(self):
+        self._songs.clear()
+        self._ends.clear()
+        self._base = 0
+
+    def _rebuild(self):
+        # MIDDLE EDITS SHIFT EVERY LATER END - ONE O(n) PASS, SAME COST AS THE EDIT ITSELF
+        songs = list(self._songs)
+        self.clear()
+        self.extend(songs)
+
+    @property
+    def total_duration(self):
+        return self._ends[-1] - self._base if self._ends else 0
+
+    def start_of(self, index):
+        """Seconds from the head song starting until the song at index starts"""
+        return self._ends[index] - self._duration(self._songs[index]) - self._base
+
+    def head(self, count):
+        return list(islice(self._songs, count))
+
+    def __getitem__(self, index):
+        return self._songs[index]
+
+    def __iter__(self):
+        return iter(self._songs)
+
+    def __len__(self):
+        return len(self._songs)
+
+
+class GuildPlayer:
+    """Per-guild playback state"""
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.queue = SongQueue()  # Manually played queue
+        self.autoplay_queue = SongQueue()  # Autoplay queue - only loads 2 songs at a time
+        self.autoplay_recommendations = deque()  # Autoplay recs - full list for autoplay queue to pull from
+
+        # EVENT-DRIVEN PLAYBACK - THE AUDIO THREAD ONLY EVER PUTS (song, error) ON events
+        self.events = asyncio.Queue()
+        self.lock = asyncio.Lock()  # Held while a transition picks and starts a song - never across stream resolution
+        self.starting = False  # A transition is resolving its stream outside the lock
+        self.task = None  # Long-lived task consuming events
+        self.ctx = None  # Latest command context - voice client and channel for embeds
+
+        # AUTOPLAY PRODUCER - REFILLS autoplay_queue WHENEVER autoplay_wanted IS SET
+        self.autoplay_task = None
+        self.autoplay_wanted = asyncio.Event()
+
+        # LATEST /play IDENTIFICATION - RELABELS THE SONG AND SEEDS AUTOPLAY ONCE MUSICBRAINZ ANSWERS
+        self.identify_task = None
+
+
+class PlayedHistory:
+    """Recently played songs, bounded by size and age, keyed every way a repeat can show up"""
+
+    def __init__(self, max_entries=500, ttl=6 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (played_at, song, ids), oldest first
+
+    @staticmethod
+    def _keys(song=None, artist=None, title=None, mbid=None, query=None):
+        keys = []
+        artist = artist or (song.artist if song else None)
+        title = title or (song.track if song else None)
+        if artist and title:
+            keys.append(f"track:{track_key(artist, title)}")
+        if song and song.video_id:
+            keys.append(f"video:{song.video_id}")
+        if mbid:
+            keys.append(f"mbid:{mbid}")
+        if query:
+            keys.append(f"query:{normalize(query)}")
+        return keys
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            played_at = next(iter(self._entries.values()))[0]
+            if played_at >= cutoff and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time() - self.ttl:
+            return None
+        return entry
+
+    def record(self, song, mbid=None, query=None):
+        now = time.time()
+        # ALL OF A SONG'S KEYS SHARE ONE ids DICT - AN MBID LEARNED LATER REACHES THE QUERY KEY TOO
+        entry = next(filter(None, map(self._get, self._keys(song))), None)
+        ids = entry[2] if entry else {'mbid': None}
+        ids['mbid'] = mbid or ids['mbid']
+        for key in self._keys(song, mbid=ids['mbid'], query=query):
+            self._entries[key] = (now, song, ids)
+            self._entries.move_to_end(key)
+        self._expire()
+
+    def played(self, artist=None, title=None, mbid=None, video_id=None):
+        keys = self._keys(artist=artist, title=title, mbid=mbid)
+        if video_id:
+            keys.append(f"video:{video_id}")
+        return any(self._get(key) for key in keys)
+
+    def find(self, query):
+        """(song, mbid) previously resolved for the same request, or None"""
+        entry = self._get(f"query:{normalize(query)}")
+        return (entry[1], entry[2]['mbid']) if entry else None
+
+    def __len__(self):
+        return len(self._entries)
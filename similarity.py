@@ -0,0 +1,154 @@
+import os
+import random
+import sqlite3
+import threading
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+def track_key(artist, title):
+    return f"{normalize(artist)}\t{normalize(title)}"
+
+
+class SimilarityGraph:
+    """Local weighted track->track and artist->artist graph grown from Last.fm responses"""
+
+    def __init__(self, path, min_neighbors=10, restart_probability=0.3):
+        self.path = path
+        self.min_neighbors = min_neighbors
+        self.restart_probability = restart_probability
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS track_edges (
+                src TEXT NOT NULL,
+                dst TEXT NOT NULL,
+                dst_artist TEXT NOT NULL,
+                dst_title TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (src, dst)
+            );
+            CREATE TABLE IF NOT EXISTS artist_edges (
+                src TEXT NOT NULL,
+                dst TEXT NOT NULL,
+                dst_name TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (src, dst)
+            );
+            CREATE TABLE IF NOT EXISTS artist_tracks (
+                artist TEXT NOT NULL,
+                title_key TEXT NOT NULL,
+                artist_name TEXT NOT NULL,
+                title TEXT NOT NULL,
+                rank INTEGER NOT NULL,
+                PRIMARY KEY (artist, title_key)
+            );
+        """)
+        self._conn.commit()
+
+    ### RECORDING ###
+    def add_similar_tracks(self, artist, title, similar):
+        """Replace a track's outgoing edges with (artist, title, match) tuples"""
+        src = track_key(artist, title)
+        rows = [
+            (src, track_key(a, t), a, t, weight)
+            for a, t, weight in similar
+            if track_key(a, t) != src
+        ]
+        with self._lock:
+            self._conn.execute("DELETE FROM track_edges WHERE src = ?", (src,))
+            self._conn.executemany("INSERT OR REPLACE INTO track_edges VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def add_similar_artists(self, artist, similar):
+        """Replace an artist's outgoing edges with (name, match) tuples"""
+        src = normalize(artist)
+        rows = [(src, normalize(name), name, weight) for name, weight in similar if normalize(name) != src]
+        with self._lock:
+            self._conn.execute("DELETE FROM artist_edges WHERE src = ?", (src,))
+            self._conn.executemany("INSERT OR REPLACE INTO artist_edges VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def add_top_tracks(self, artist, tracks):
+        """Replace an artist's known top tracks with (artist, title) tuples in rank order"""
+        src = normalize(artist)
+        rows = [(src, normalize(t), a, t, rank) for rank, (a, t) in enumerate(tracks)]
+        with self._lock:
+            self._conn.execute("DELETE FROM artist_tracks WHERE artist = ?", (src,))
+            self._conn.executemany("INSERT OR REPLACE INTO artist_tracks VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    ### QUERIES ###
+    def recommend(self, artist, title, limit=10):
+        """Answer from the seed track's own edges, or return [] if it has fewer than min_neighbors"""
+        recs = self._random_walk(track_key(artist, title), limit)
+        return recs if len(recs) >= limit else []
+
+    def recommend_from_artists(self, artist, limit=10):
+        """Last resort once the network tiers fail - tracks by the artist and its known neighbors"""
+        return self._similar_artist_tracks(artist, limit)
+
+    def _track_neighbors(self, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT dst, dst_artist, dst_title, weight FROM track_edges WHERE src = ?", (key,)
+            ).fetchall()
+
+    def _random_walk(self, seed, limit):
+        # WEIGHTED RANDOM WALK WITH RESTARTS - STAYS NEAR THE SEED BUT REACHES SECOND-HOP TRACKS
+        adjacency = {seed: self._track_neighbors(seed)}
+        if len(adjacency[seed]) < self.min_neighbors:
+            return []
+
+        results = {}
+        current = seed
+        for _ in range(limit * 20):
+            if current not in adjacency:
+                adjacency[current] = self._track_neighbors(current)
+
+            # DEAD END OR RANDOM RESTART - JUMP BACK TO THE SEED
+            if not adjacency[current] or (current != seed and random.random() < self.restart_probability):
+                current = seed
+
+            edges = adjacency[current]
+            key, dst_artist, dst_title, _ = random.choices(edges, weights=[max(e[3], 0.01) for e in edges])[0]
+            if key != seed and key not in results:
+                results[key] = {"title": dst_title, "artist": dst_artist}
+                if len(results) >= limit:
+                    break
+            current = key
+
+        return list(results.values())
+
+    def _similar_artist_tracks(self, artist, limit):
+        src = normalize(artist)
+        with self._lock:
+            neighbors = self._conn.execute(
+                "SELECT dst FROM artist_edges WHERE src = ? ORDER BY weight DESC", (src,)
+            ).fetchall()
+            if not neighbors:
+                return []
+
+            artists = [src] + [row[0] for row in neighbors]
+            placeholders = ", ".join("?" * len(artists))
+            rows = self._conn.execute(
+                f"SELECT artist_name, title FROM artist_tracks WHERE artist IN ({placeholders})", artists
+            ).fetchall()
+
+        pool = [{"title": title, "artist": artist_name} for artist_name, title in rows]
+        if len(pool) <= limit:
+            return pool
+        return random.sample(pool, limit)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
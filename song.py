@@ -0,0 +1,103 @@
+import sys
+
+YOUTUBE_WATCH_URL = "https://www.youtube.com/watch?v="
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# SONG DATA
+class Song:
+    # SLOTS INSTEAD OF A __dict__ - ONE OF THESE LIVES IN MEMORY FOR EVERY QUEUED TRACK IN EVERY GUILD
+    __slots__ = ('title', 'track', 'artist', '_url', 'audio_url', 'duration', '_requester', '_source', 'video_id', 'codec', 'uploader')
+
+    def __init__(self, title, url, audio_url, duration, track=None, artist=None, requester=None, source="youtube", video_id=None, codec=None, uploader=None):
+        self.title = title # Youtube video title NOT the song title
+        self.track = track
+        self.artist = artist
+        self.video_id = video_id # Key for the stream URL cache
+        self.url = url
+        self.audio_url = audio_url
+        self.duration = duration
+        self.requester = requester # May want to change this later but will just manually set in the discord command to separate logic
+        self.source = source
+        self.codec = codec # Stream audio codec - opus streams can be copied straight through
+        self.uploader = _intern(uploader) # Channel name - "Artist - Topic" uploads only carry the artist here
+
+    # WATCH PAGES ARE REBUILT FROM THE VIDEO ID - ONLY OTHER URLS ARE STORED
+    @property
+    def url(self):
+        return self._url if self._url is not None else YOUTUBE_WATCH_URL + self.video_id
+
+    @url.setter
+    def url(self, url):
+        self._url = None if self.video_id and url == YOUTUBE_WATCH_URL + self.video_id else url
+
+    # A HANDFUL OF DISTINCT VALUES SHARED BY THOUSANDS OF SONGS - ONE COPY EACH
+    @property
+    def requester(self):
+        return self._requester
+
+    @requester.setter
+    def requester(self, requester):
+        self._requester = _intern(requester)
+
+    @property
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, source):
+        self._source = _intern(source)
+
+    @classmethod
+    def from_youtube(cls, info, song_name = None, artist_name = None):
+        return cls(
+            title=info['title'],
+            track = song_name,
+            artist = artist_name,
+            url=info['webpage_url'],
+            # SIGNED STREAM URLS ARE ~1KB AND EXPIRE ANYWAY - KEPT IN THE STREAM CACHE AND ATTACHED AT PLAY TIME
+            audio_url=info['url'] if not info.get('id') else None,
+            duration=info['duration'],
+            # May want to change this later but will just manually set in the discord command to separate logic
+            #requester=requester,
+            source="youtube",
+            video_id=info.get('id'),
+            codec=info.get('acodec'),
+            uploader=info.get('uploader') or info.get('channel')
+        )
+
+    @classmethod
+    def from_flat_entry(cls, entry):
+        # FLAT PLAYLIST ENTRY - NO STREAM URL YET, RESOLVED RIGHT BEFORE IT PLAYS
+        return cls(
+            title=entry.get('title') or entry['id'],
+            url=f"{YOUTUBE_WATCH_URL}{entry['id']}",
+            audio_url=None,
+            duration=int(entry.get('duration') or 0),
+            source="youtube",
+            video_id=entry['id'],
+            uploader=entry.get('uploader') or entry.get('channel')
+        )
+
+    @classmethod
+    def from_local_file(cls, filepath, metadata, requester):
+        return cls(
+            title=metadata['title'],
+            url=filepath,
+            audio_url=filepath,
+            duration=metadata['duration'],
+            requester=requester,
+            source="local",
+            video_id=metadata.get('video_id'),
+            codec=metadata.get('codec')
+        )
+
+    def link(self):
+        # LOCAL FILE PATHS AREN'T CLICKABLE IN DISCORD
+        return f"[{self.title}]({self.url})" if self.source != "local" else f"**{self.title}**"
+
+    def __str__(self):
+        return f"{self.title} ({self.source})"
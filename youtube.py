@@ -0,0 +1,175 @@
+import asyncio
+import multiprocessing
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+import yt_dlp
+
+# FIELDS Song.from_youtube AND query_youtube'S FILTERING ACTUALLY READ
+SONG_FIELDS = ('id', 'title', 'webpage_url', 'url', 'duration', 'acodec', 'uploader', 'channel')
+
+# SIGNED GOOGLEVIDEO URLS CARRY EXPIRE EITHER AS A QUERY PARAM OR A /expire/<ts>/ PATH SEGMENT
+EXPIRE_PATH_RE = re.compile(r'/expire/(\d+)')
+VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|/shorts/)([\w-]{11})')
+
+# EACH WORKER THREAD (OR PROCESS) KEEPS ITS OWN WARM YOUTUBEDL - INSTANCES AREN'T THREAD SAFE
+_worker = threading.local()
+
+
+class ExtractionError(Exception):
+    """Picklable stand-in for yt-dlp errors raised inside a worker process"""
+
+
+def _init_worker(ydl_opts):
+    _worker.ydl = yt_dlp.YoutubeDL(ydl_opts)
+
+
+def _warm_up():
+    return True
+
+
+def compact_info(info):
+    """Strip an info dict down to what the bot needs - keeps process pool results cheap to pickle"""
+    if info is None:
+        return None
+    if 'entries' in info:
+        return {
+            'title': info.get('title'),
+            'entries': [compact_info(entry) for entry in info['entries']],
+        }
+    return {field: info.get(field) for field in SONG_FIELDS}
+
+
+def _extract(url, download, compact):
+    # RUNS IN THE WORKER - RETURNS ITS START TIME SO THE CALLER CAN SPLIT QUEUE WAIT FROM EXTRACTION
+    started = time.time()
+    if not compact:
+        return started, _worker.ydl.extract_info(url, download=download)
+
+    # YT-DLP ERRORS CARRY UNPICKLABLE STATE - SEND BACK JUST THE MESSAGE
+    try:
+        info = _worker.ydl.extract_info(url, download=download)
+    except Exception as e:
+        raise ExtractionError(str(e)) from None
+    return started, compact_info(info)
+
+
+class YDLPool:
+    """Bounded pool of workers, each holding its own warm YoutubeDL instance"""
+
+    def __init__(self, ydl_opts, max_workers=4, processes=False):
+        self.ydl_opts = ydl_opts
+        self.max_workers = max_workers
+        self.processes = processes
+
+        if processes:
+            # OPT-IN: EXTRACTION IN SEPARATE PROCESSES SO IT NEVER HOLDS THE VOICE LOOP'S GIL
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(ydl_opts,)
+            )
+            # FORK EVERY WORKER NOW, BEFORE THE BOT HAS STARTED ANY THREADS
+            self.executor.submit(_warm_up).result()
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="ytdl",
+                initializer=_init_worker,
+                initargs=(ydl_opts,)
+            )
+
+        # QUEUEING METRICS - ONLY TOUCHED FROM THE EVENT LOOP
+        self.queued = 0  # Submitted and not yet finished
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_extract = 0.0
+
+    async def extract_info(self, url, download=False):
+        self.queued += 1
+        submitted = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            started, info = await loop.run_in_executor(self.executor, _extract, url, download, self.processes)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.queued -= 1
+            self.completed += 1
+
+        self.total_wait += max(started - submitted, 0.0)
+        self.total_extract += time.time() - started
+        return info
+
+    def stats(self):
+        done = (self.completed - self.failed) or 1
+        return {
+            "mode": "process" if self.processes else "thread",
+            "workers": self.max_workers,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": self.total_wait / done,
+            "avg_extract": self.total_extract / done,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_expiry(url, default_ttl=3600):
+    """Unix time a signed stream URL stops working - unknown URLs get a conservative default"""
+    query = parse_qs(urlparse(url).query)
+    if 'expire' in query:
+        return int(query['expire'][0])
+    match = EXPIRE_PATH_RE.search(url)
+    if match:
+        return int(match.group(1))
+    return int(time.time()) + default_ttl
+
+
+def video_id_from_url(url):
+    match = VIDEO_ID_RE.search(url)
+    return match.group(1) if match else None
+
+
+class StreamCache:
+    """Resolved stream info keyed by video ID, aware of each signed URL's expiry"""
+
+    def __init__(self, max_entries=2000, refresh_margin=1800):
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin  # Refresh in the background once this close to expiry
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # video_id -> (compact info, expires_at)
+
+    def put(self, info):
+        if not info or not info.get('id') or not info.get('url'):
+            return
+        self._entries[info['id']] = (compact_info(info), stream_expiry(info['url']))
+        self._entries.move_to_end(info['id'])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, video_id, min_ttl=0):
+        """Cached info whose URL stays valid for at least min_ttl more seconds, else None"""
+        entry = self._entries.get(video_id)
+        if entry is None or entry[1] - time.time() <= min_ttl:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(video_id)
+        self.hits += 1
+        return entry[0]
+
+    def expiring_soon(self, video_id):
+        entry = self._entries.get(video_id)
+        return entry is not None and entry[1] - time.time() < self.refresh_margin
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}